@@ -0,0 +1,167 @@
+"""Benchmarks for the T100 checker.
+
+Run ``python benchmark.py --save baseline.json`` on a known good revision and
+``python benchmark.py --compare baseline.json`` on a change to fail on regressions.
+"""
+import argparse
+import ast
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from flake8_debugger import DebuggerChecker
+
+
+def large_module(scale):
+    template = (
+        "class Model{0}(object):\n"
+        '    """Model number {0}."""\n'
+        "\n"
+        "    def __init__(self, a, b={0}):\n"
+        "        self.values = [a + b * item for item in range({0})]\n"
+        "\n"
+        "    def total(self):\n"
+        "        if self.values:\n"
+        "            return sum(value for value in self.values if value % 2)\n"
+        "        return {{'empty': True, 'index': {0}}}\n"
+        "\n"
+        "\n"
+    )
+    return ["import pdb\n\n\n" + "".join(template.format(index) for index in range(scale * 200))]
+
+
+def nested_calls(scale):
+    # Left-nested binary operations are the deepest trees ``ast.parse`` accepts, calls sit at every level.
+    return ["import pdb\nx = " + " + ".join(["f(pdb.set_trace())"] * 400) + "\n" for _ in range(scale)]
+
+
+def aliased_imports(scale):
+    lines = []
+    for index in range(scale * 500):
+        lines.append("from ipdb import set_trace as trace{0}\n".format(index))
+        lines.append("import pdb as debugger{0}\n".format(index))
+        lines.append("trace{0}()\ndebugger{0}.set_trace()\n".format(index))
+    return ["".join(lines)]
+
+
+def noqa_lines(scale):
+    return ["import pdb  # noqa\n" + "pdb.set_trace()  # noqa: T100\n" * (scale * 2000)]
+
+
+def real_world_corpus(scale):
+    """Sources of the standard library, the same files in the same order on every run."""
+    directory = os.path.dirname(os.__file__)
+    sources = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py") and len(sources) < scale * 40:
+            with open(os.path.join(directory, name), "rb") as source_file:
+                source = source_file.read().decode("utf-8", "replace")
+            try:
+                ast.parse(source)
+            except SyntaxError:
+                continue
+            sources.append(source)
+    return sources
+
+
+CASES = {
+    "large_module": large_module,
+    "nested_calls": nested_calls,
+    "aliased_imports": aliased_imports,
+    "noqa_lines": noqa_lines,
+    "real_world_corpus": real_world_corpus,
+}
+
+
+def run_case(sources, repeat):
+    """Check ``sources`` ``repeat`` times and return the best throughput and the peak memory seen."""
+    nodes = sum(sum(1 for _ in ast.walk(ast.parse(source))) for source in sources)
+    lines = [source.splitlines(True) for source in sources]
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for source_lines in lines:
+            for _ in DebuggerChecker(None, "benchmark.py", source_lines).run():
+                pass
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    for source_lines in lines:
+        for _ in DebuggerChecker(None, "benchmark.py", source_lines).run():
+            pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"files_per_second": len(sources) / best, "nodes_per_second": nodes / best, "peak_memory": peak}
+
+
+def run(cases=None, scale=1, repeat=5):
+    results = {}
+    for name in cases or sorted(CASES):
+        results[name] = run_case(CASES[name](scale), repeat)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return a description of every metric that regressed by more than ``tolerance`` against ``baseline``."""
+    regressions = []
+    for name, metrics in sorted(results.items()):
+        if name not in baseline:
+            continue
+        for metric in ("files_per_second", "nodes_per_second"):
+            if metrics[metric] < baseline[name][metric] * (1 - tolerance):
+                regressions.append(
+                    "{0}: {1} fell from {2:,.0f} to {3:,.0f}".format(
+                        name, metric, baseline[name][metric], metrics[metric]
+                    )
+                )
+        if metrics["peak_memory"] > baseline[name]["peak_memory"] * (1 + tolerance):
+            regressions.append(
+                "{0}: peak_memory grew from {1:,} to {2:,} bytes".format(
+                    name, baseline[name]["peak_memory"], metrics["peak_memory"]
+                )
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the T100 checker.")
+    parser.add_argument(
+        "cases", nargs="*", help="Cases to run, any of {0}. (Default: all)".format(", ".join(sorted(CASES)))
+    )
+    parser.add_argument("--scale", type=int, default=1, help="Multiplier for the size of the generated inputs.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case, the fastest is reported.")
+    parser.add_argument("--save", metavar="PATH", help="Write the results to PATH as a baseline.")
+    parser.add_argument("--compare", metavar="PATH", help="Fail if the results regress against the baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression ratio. (Default: 0.2)")
+    args = parser.parse_args(argv)
+    unknown = sorted(set(args.cases) - set(CASES))
+    if unknown:
+        parser.error("unknown cases: {0}".format(", ".join(unknown)))
+
+    results = run(args.cases, args.scale, args.repeat)
+    for name, metrics in sorted(results.items()):
+        print(
+            "{0:<20} {1:>12,.1f} files/s {2:>14,.0f} nodes/s {3:>14,} bytes peak".format(
+                name, metrics["files_per_second"], metrics["nodes_per_second"], metrics["peak_memory"]
+            )
+        )
+
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
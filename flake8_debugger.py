@@ -1,13 +1,15 @@
 """Extension for flake8 that finds usage of the debugger."""
 import ast
-from itertools import chain
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from itertools import islice
+from types import MappingProxyType
 
-import pycodestyle
-
-try:
-    from flake8.engine import pep8 as stdin_utils
-except ImportError:
-    from flake8 import utils as stdin_utils
+# flake8 imports every plugin in every worker process, so anything only needed for reading files itself, the
+# cache, or the standalone command is imported where it is used.
 
 __version__ = "4.1.2"
 
@@ -24,78 +26,1744 @@ debuggers = {
 }
 
 
+class DebuggerRegistry(object):
+    """Lookup index over a ``debuggers`` table, compiled once and never mutated."""
+
+    def __init__(self, table):
+        self.modules = MappingProxyType({module: frozenset(methods) for module, methods in table.items()})
+        methods = {}
+        for module, module_methods in table.items():
+            for method in module_methods:
+                methods.setdefault(method, set()).add(module)
+        self.methods = MappingProxyType({method: frozenset(modules) for method, modules in methods.items()})
+        self.method_names = frozenset(self.methods)
+        # Methods of ``builtins`` are reported when called by their bare name, unless the file rebinds it.
+        self.builtins = self.modules.get("builtins", frozenset())
+        # Every detectable usage spells out a method name or the last component of a module name, so a
+        # source without any of them can be skipped without parsing or visiting it.
+        tokens = set(self.method_names)
+        tokens.update(module.rpartition(".")[2] for module in self.modules)
+        pattern = "|".join(re.escape(token) for token in sorted(tokens, key=len, reverse=True))
+        self.pattern = re.compile(pattern)
+        self.bytes_pattern = re.compile(pattern.encode("ascii"))
+        self._fingerprint = None
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            import hashlib
+            import json
+
+            table_items = sorted((module, sorted(methods)) for module, methods in self.modules.items())
+            self._fingerprint = hashlib.sha256(json.dumps(table_items).encode("utf-8")).hexdigest()
+        return self._fingerprint
+
+    def might_use_debugger(self, source):
+        pattern = self.pattern if isinstance(source, str) else self.bytes_pattern
+        return pattern.search(source) is not None
+
+
+DEFAULT_REGISTRY = DebuggerRegistry(debuggers)
+
+
+def parse_debuggers(entries, base=None):
+    """Build a debuggers table from ``module:method`` entries, on top of a copy of ``base``.
+
+    A bare ``module`` entry only flags imports of that module.
+    """
+    table = {module: list(methods) for module, methods in (base or {}).items()}
+    for entry in entries:
+        module, _, method = entry.partition(":")
+        module, method = module.strip(), method.strip()
+        if not module:
+            continue
+        methods = table.setdefault(module, [])
+        if method and method not in methods:
+            methods.append(method)
+    return table
+
+
+def cache_key(source, registry):
+    import hashlib
+
+    if not isinstance(source, bytes):
+        source = source.encode("utf-8", "surrogatepass")
+    digest = hashlib.sha256(source)
+    digest.update(registry.fingerprint.encode("ascii"))
+    digest.update(__version__.encode("ascii"))
+    return digest.hexdigest()
+
+
+class MemoryCache(object):
+    """In-process counterpart of ``ResultCache`` for long running processes, bounded to ``max_entries``."""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, source, registry):
+        return cache_key(source, registry)
+
+    def get(self, key):
+        with self._lock:
+            errors = self.entries.get(key)
+            if errors is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return errors
+
+    def set(self, key, errors):
+        with self._lock:
+            self.entries[key] = errors
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class ResultCache(object):
+    """On-disk store of a file's results, keyed by its content, the debugger table and the plugin version.
+
+    Entries are small JSON files; once the directory grows past ``max_bytes`` the least recently used ones
+    are evicted. Any I/O failure is treated as a cache miss so the cache can never break a lint run.
+    """
+
+    prune_every = 256
+
+    def __init__(self, directory, max_bytes=32 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+
+    def key(self, source, registry):
+        return cache_key(source, registry)
+
+    def get(self, key):
+        import json
+
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "r") as cache_file:
+                errors = [tuple(error) for error in json.load(cache_file)]
+            os.utime(path, None)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return errors
+
+    def set(self, key, errors):
+        import json
+        import tempfile
+
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            handle, temporary_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+            with os.fdopen(handle, "w") as cache_file:
+                json.dump(errors, cache_file, separators=(",", ":"))
+            os.replace(temporary_path, os.path.join(self.directory, key))
+        except OSError:
+            return
+        if self._writes % self.prune_every == 0:
+            self.prune()
+        self._writes += 1
+
+    def prune(self):
+        try:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+# Set by the process that started a profile, so that workers flake8 spawns write to the same directory.
+PROFILE_DIRECTORY_ENV = "FLAKE8_DEBUGGER_PROFILE_DIR"
+PROFILE_STEPS = ("read", "prescreen", "parse", "visit", "noqa", "total")
+
+
+class Stopwatch(object):
+    """Add the time since the last lap to a step of a profile ``entry``, as built by ``new_entry``."""
+
+    def __init__(self, entry):
+        import time
+
+        self.entry = entry
+        self.clock = time.perf_counter
+        self.start = self.last = self.clock()
+
+    @staticmethod
+    def new_entry(filename):
+        entry = {"filename": filename, "nodes": 0, "cache": None}
+        entry.update(dict.fromkeys(PROFILE_STEPS, 0.0))
+        return entry
+
+    def lap(self, step):
+        now = self.clock()
+        if step is not None:
+            self.entry[step] += now - self.last
+        self.last = now
+
+    def stop(self):
+        self.entry["total"] = self.clock() - self.start
+        return self.entry
+
+
+class _NoStopwatch(object):
+    entry = None
+
+    def lap(self, step):
+        pass
+
+
+NO_STOPWATCH = _NoStopwatch()
+
+
+class Profiler(object):
+    """Records how long the checker spends on each file, one JSON line per file in a file per process.
+
+    Only the process that started the profile has a ``path``: it merges the records of every process into
+    a summary when it exits. Any I/O failure drops records rather than breaking the lint run.
+    """
+
+    def __init__(self, directory, path=None, top=10):
+        self.directory = directory
+        self.path = path
+        self.top = top
+        self.pid = None
+        self.file = None
+
+    @classmethod
+    def start(cls, path, top=10):
+        """Join the profile of the run this process is part of, or start one summarized to ``path`` at exit."""
+        directory = os.environ.get(PROFILE_DIRECTORY_ENV)
+        if directory is not None:
+            return cls(directory)
+
+        import atexit
+        import tempfile
+
+        profiler = cls(tempfile.mkdtemp(prefix="flake8-debugger-profile-"), path, top)
+        os.environ[PROFILE_DIRECTORY_ENV] = profiler.directory
+        atexit.register(profiler.finish)
+        return profiler
+
+    def record(self, entry):
+        import json
+
+        try:
+            # A forked worker inherits the profiler of its parent, but must not share its file.
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.file = open(os.path.join(self.directory, "{0}.jsonl".format(self.pid)), "a")
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+        except OSError:
+            pass
+
+    def finish(self):
+        """Write the summary of every process's records to ``path`` (``-`` for stderr) and remove them."""
+        import atexit
+        import json
+        import shutil
+
+        atexit.unregister(self.finish)
+        if self.file is not None and self.pid == os.getpid():
+            self.file.close()
+        summary = summarize_profile(self.directory, self.top)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        if os.environ.get(PROFILE_DIRECTORY_ENV) == self.directory:
+            del os.environ[PROFILE_DIRECTORY_ENV]
+        if self.path == "-":
+            sys.stderr.write(json.dumps(summary, indent=2) + "\n")
+        elif self.path:
+            with open(self.path, "w") as summary_file:
+                json.dump(summary, summary_file, indent=2)
+        return summary
+
+
+def summarize_profile(directory, top=10):
+    """Total the records of every process in ``directory`` and pick the ``top`` slowest files."""
+    import heapq
+    import json
+
+    summary = {
+        "files": 0,
+        "processes": 0,
+        "seconds": dict.fromkeys(PROFILE_STEPS, 0.0),
+        "nodes": 0,
+        "cache": {"hits": 0, "misses": 0},
+        "slowest": [],
+    }
+    slowest = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".jsonl"):
+            continue
+        summary["processes"] += 1
+        with open(os.path.join(directory, name)) as records:
+            for line in records:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                summary["files"] += 1
+                for step in PROFILE_STEPS:
+                    summary["seconds"][step] += entry[step]
+                summary["nodes"] += entry["nodes"]
+                if entry["cache"] is not None:
+                    summary["cache"]["hits" if entry["cache"] == "hit" else "misses"] += 1
+                # Keep only the slowest ``top`` entries, so memory stays flat however many files were checked.
+                item = (entry["total"], summary["files"], entry)
+                if len(slowest) < top:
+                    heapq.heappush(slowest, item)
+                elif top:
+                    heapq.heappushpop(slowest, item)
+    summary["slowest"] = [entry for _, _, entry in sorted(slowest, key=lambda item: (-item[0], item[1]))]
+    return summary
+
+
+NOQA_REGEX = re.compile(r"#\s*no(?:qa|pep8)\b(?::[\s]?(?P<codes>[A-Z][0-9]+(?:[,\s]+[A-Z][0-9]+)*))?", re.I)
+
+
+def parse_noqa(source):
+    """Map each line number with a ``# noqa`` comment to the codes it suppresses, or ``None`` for all codes."""
+    noqa = {}
+    line = 1
+    position = 0
+    for match in NOQA_REGEX.finditer(source):
+        line += source.count("\n", position, match.start())
+        position = match.start()
+        codes = match.group("codes")
+        if codes is None:
+            noqa[line] = None
+        elif noqa.get(line, ()) is not None:
+            noqa[line] = noqa.get(line, frozenset()) | frozenset(re.split(r"[,\s]+", codes.upper()))
+    return noqa
+
+
+def is_suppressed(noqa, line, code=DEBUGGER_ERROR_CODE):
+    if line not in noqa:
+        return False
+    codes = noqa[line]
+    return codes is None or code.startswith(tuple(codes))
+
+
+# Kinds of finding; usages sort before imports so an import is only reported where no usage was.
+USED, USED_AS, USED_ON, IMPORTED, IMPORTED_AS = range(5)
+
+MESSAGES = (
+    "{code} trace found: {symbol} used",
+    "{code} trace found: {symbol} used as {alias}",
+    "{code} trace found: {alias}.{symbol} used",
+    "{code} import for {symbol} found",
+    "{code} import for {symbol} found as {alias}",
+)
+
+
+class Finding(object):
+    """A single debugger usage or import; the message is only rendered when asked for."""
+
+    __slots__ = ("line", "col", "kind", "symbol", "alias")
+
+    def __init__(self, line, col, kind, symbol, alias=None):
+        self.line = line
+        self.col = col
+        self.kind = kind
+        self.symbol = symbol
+        self.alias = alias
+
+    @property
+    def message(self):
+        return MESSAGES[self.kind].format(code=DEBUGGER_ERROR_CODE, symbol=self.symbol, alias=self.alias)
+
+    def __repr__(self):
+        return "Finding({0!r}, {1!r}, {2!r})".format(self.line, self.col, self.message)
+
+
+# What a name is bound to: a debugger module, a debugger method, a module missing from the table, or anything
+# else defined in the file. Names that are not bound at all may be builtins or come from elsewhere.
+MODULE, METHOD, FOREIGN, LOCAL = range(4)
+
+
+class Binding(object):
+    __slots__ = ("kind", "module", "method", "caller")
+
+    def __init__(self, kind, module=None, method=None, caller=None):
+        self.kind = kind
+        self.module = module
+        # For a method, the module name it was looked up on (``ipdb`` in ``st = ipdb.set_trace``), if any. For
+        # a module, whether calls on it are reported with the name it is bound to.
+        self.method = method
+        self.caller = caller
+
+
+FOREIGN_BINDING = Binding(FOREIGN)
+LOCAL_BINDING = Binding(LOCAL)
+
+
+class Scope(object):
+    __slots__ = ("bindings", "is_class", "is_comprehension", "name")
+
+    def __init__(self, is_class=False, name=None, parameters=(), is_comprehension=False):
+        self.bindings = dict.fromkeys(parameters, LOCAL_BINDING)
+        self.is_class = is_class
+        self.is_comprehension = is_comprehension
+        # The function or class the scope is the body of, bound in the enclosing scope as the scope opens.
+        self.name = name
+
+
+def _parameters(arguments):
+    """Return the names of every parameter in an ``ast.arguments``."""
+    names = [argument.arg for argument in getattr(arguments, "posonlyargs", [])]
+    names.extend(argument.arg for argument in arguments.args)
+    names.extend(argument.arg for argument in arguments.kwonlyargs)
+    names.extend(argument.arg for argument in (arguments.vararg, arguments.kwarg) if argument is not None)
+    return names
+
+
+def _order(finding):
+    return finding.kind >= IMPORTED, finding.line, finding.col
+
+
 class DebuggerFinder(ast.NodeVisitor):
+    # Only these node types are dispatched to their ``visit_<name>`` method; everything else is just walked.
+    visited_nodes = (
+        ast.Import,
+        ast.ImportFrom,
+        ast.Call,
+        ast.Assign,
+        ast.AnnAssign,
+        ast.FunctionDef,
+        ast.AsyncFunctionDef,
+        ast.ClassDef,
+        ast.Lambda,
+        ast.ListComp,
+        ast.SetComp,
+        ast.GeneratorExp,
+        ast.DictComp,
+        ast.comprehension,
+        ast.For,
+        ast.AsyncFor,
+        ast.withitem,
+        ast.ExceptHandler,
+    ) + ((ast.NamedExpr,) if hasattr(ast, "NamedExpr") else ())
+    # The fields that run in the scope a handler returns; whatever else the node holds runs where it is.
+    scope_fields = {
+        ast.ListComp: ("generators", "elt"),
+        ast.SetComp: ("generators", "elt"),
+        ast.GeneratorExp: ("generators", "elt"),
+        ast.DictComp: ("generators", "key", "value"),
+    }
+
     def __init__(self, *args, **kwargs):
+        self.registry = kwargs.pop("registry", DEFAULT_REGISTRY)
         super(DebuggerFinder, self).__init__(*args, **kwargs)
-        self.debuggers_used = {}
-        self.debuggers_traces_redefined = {}
-        self.debuggers_traces_names = {}
-        self.debugger_traces_imported = {}
-        self.debuggers_names = {}
-        self.debuggers_redefined = {}
-        self.debuggers_imported = {}
+        self.handlers = {node_type: getattr(self, "visit_" + node_type.__name__) for node_type in self.visited_nodes}
+        self.nodes_visited = 0
+        self.reset()
+
+    def reset(self):
+        """Forget everything found so far, so that the finder can be reused for another tree."""
+        self.findings = []
+        self.scopes = [Scope()]
+
+    def visit(self, node):
+        """Walk the tree depth-first in source order with an explicit stack instead of recursion.
+
+        Handlers return the ``Scope`` a node's body runs in. Everything else the node holds, decorators,
+        defaults, annotations and bases, is walked first in the enclosing scope, as Python evaluates it.
+        A comprehension runs in a scope of its own, its ``for`` clauses before the element they produce.
+        """
+        handlers = self.handlers
+        scope_fields = self.scope_fields
+        stack = [node]
+        pop = stack.pop
+        push = stack.append
+        visited = 0
+        while stack:
+            node = pop()
+            if node is None:
+                self.scopes.pop()
+                continue
+            if node.__class__ is Scope:
+                if node.name is not None:
+                    self.bind(node.name, LOCAL_BINDING)
+                self.scopes.append(node)
+                continue
+            visited += 1
+            handler = handlers.get(type(node))
+            fields = node._fields
+            scope = handler(node) if handler is not None else None
+            if scope is not None:
+                push(None)
+                inner = scope_fields.get(type(node), ("body",))
+                for field in reversed(inner):
+                    value = getattr(node, field)
+                    if isinstance(value, list):
+                        for item in reversed(value):
+                            push(item)
+                    else:
+                        push(value)
+                push(scope)
+                fields = [field for field in fields if field not in inner]
+            # Children are pushed in reverse so they are popped in the order ``generic_visit`` would see them.
+            for field in reversed(fields):
+                value = getattr(node, field, None)
+                if isinstance(value, list):
+                    for item in reversed(value):
+                        if isinstance(item, ast.AST):
+                            push(item)
+                elif isinstance(value, ast.AST):
+                    push(value)
+        self.nodes_visited += visited
+
+    def results(self):
+        """Return usages in source order, then imports at locations without a usage, each finding once.
+
+        Findings at the same location keep the order they were found in, the outermost of chained calls first.
+        """
+        used = set()
+        seen = set()
+        results = []
+        for finding in sorted(self.findings, key=_order):
+            location = (finding.line, finding.col)
+            if finding.kind < IMPORTED:
+                used.add(location)
+            elif location in used:
+                continue
+            # ``import pdb, pdb`` finds the same thing twice.
+            identity = (finding.line, finding.col, finding.kind, finding.symbol, finding.alias)
+            if identity not in seen:
+                seen.add(identity)
+                results.append(finding)
+        return results
+
+    def resolve(self, name):
+        """Return what ``name`` is bound to where it is used, or ``None`` when the file does not bind it."""
+        scopes = self.scopes
+        binding = scopes[-1].bindings.get(name)
+        if binding is not None:
+            return binding
+        # Like Python, look through enclosing functions and the module but not through enclosing class bodies.
+        for scope in reversed(scopes[:-1]):
+            if not scope.is_class:
+                binding = scope.bindings.get(name)
+                if binding is not None:
+                    return binding
+        return None
+
+    def bind(self, name, binding):
+        self.scopes[-1].bindings[name] = binding
+
+    def binding_of(self, value):
+        """Return the binding a name takes when ``value`` is assigned to it."""
+        if isinstance(value, ast.Name):
+            binding = self.resolve(value.id)
+            if binding is not None and binding.kind in (MODULE, METHOD):
+                return binding
+        elif isinstance(value, ast.Attribute) and isinstance(value.value, ast.Name):
+            binding = self.resolve(value.value.id)
+            if binding is not None and binding.kind == MODULE and value.attr in self.registry.modules[binding.module]:
+                return Binding(METHOD, binding.module, value.attr, value.value.id if binding.caller else None)
+        return LOCAL_BINDING
+
+    def bind_target(self, target, binding=LOCAL_BINDING):
+        """Bind the name ``target`` assigns to, or every name it unpacks to, which could hold anything."""
+        if isinstance(target, ast.Name):
+            self.bind(target.id, binding)
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                self.bind_target(element)
+        elif isinstance(target, ast.Starred):
+            self.bind_target(target.value)
+
+    def visit_Assign(self, node):
+        binding = self.binding_of(node.value)
+        for target in node.targets:
+            self.bind_target(target, binding)
+
+    def visit_AnnAssign(self, node):
+        if isinstance(node.target, ast.Name) and node.value is not None:
+            self.bind(node.target.id, self.binding_of(node.value))
+
+    def visit_NamedExpr(self, node):
+        binding = self.binding_of(node.value)
+        # Like Python, bind the name of an assignment expression in a comprehension where the comprehension is.
+        for scope in reversed(self.scopes):
+            if not scope.is_comprehension:
+                scope.bindings[node.target.id] = binding
+                break
+
+    def visit_For(self, node):
+        self.bind_target(node.target)
+
+    visit_AsyncFor = visit_For
+    visit_comprehension = visit_For
+
+    def visit_withitem(self, node):
+        if node.optional_vars is not None:
+            self.bind_target(node.optional_vars)
+
+    def visit_ExceptHandler(self, node):
+        if node.name is not None:
+            self.bind(node.name, LOCAL_BINDING)
+
+    def visit_FunctionDef(self, node):
+        return Scope(name=node.name, parameters=_parameters(node.args))
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        return Scope(parameters=_parameters(node.args))
+
+    def visit_ClassDef(self, node):
+        return Scope(is_class=True, name=node.name)
+
+    def visit_ListComp(self, node):
+        return Scope(is_comprehension=True)
+
+    visit_SetComp = visit_ListComp
+    visit_GeneratorExp = visit_ListComp
+    visit_DictComp = visit_ListComp
 
     def visit_Call(self, node):
-        if getattr(node.func, "id", None) == "breakpoint":
-            entry = self.debuggers_used.setdefault((node.lineno, node.col_offset), [])
-            entry.append("{0} trace found: breakpoint used".format(DEBUGGER_ERROR_CODE))
-
-        debugger_method_names = list(chain(self.debuggers_traces_names.values(), *debuggers.values()))
-        is_debugger_function = getattr(node.func, "id", None) in debugger_method_names
-        if is_debugger_function:
-            if node.func.id in self.debuggers_traces_names.values():
-                debugger_method = next(
-                    item[0] for item in self.debuggers_traces_names.items() if item[1] == node.func.id
-                )
-                entry = self.debuggers_used.setdefault((node.lineno, node.col_offset), [])
-                if debugger_method == node.func.id:
-                    entry.append("{0} trace found: {1} used".format(DEBUGGER_ERROR_CODE, node.func.id))
+        func = node.func
+        if isinstance(func, ast.Name):
+            binding = self.resolve(func.id)
+            if binding is None:
+                if func.id in self.registry.builtins:
+                    self.findings.append(Finding(node.lineno, node.col_offset, USED, func.id))
+            elif binding.kind == METHOD:
+                if binding.caller is not None:
+                    self.findings.append(Finding(node.lineno, node.col_offset, USED_ON, binding.method, binding.caller))
+                elif binding.method == func.id:
+                    self.findings.append(Finding(node.lineno, node.col_offset, USED, func.id))
                 else:
-                    entry.append(
-                        "{0} trace found: {1} used as {2}".format(DEBUGGER_ERROR_CODE, debugger_method, node.func.id)
-                    )
+                    self.findings.append(Finding(node.lineno, node.col_offset, USED_AS, binding.method, func.id))
 
-        is_debugger_attribute = getattr(node.func, "attr", None) in debugger_method_names
-        if is_debugger_attribute:
-            caller = getattr(node.func.value, "id", None)
-            entry = self.debuggers_used.setdefault((node.lineno, node.col_offset), [])
-            if caller in self.debuggers_names.values():
-                entry.append("{0} trace found: {1}.{2} used".format(DEBUGGER_ERROR_CODE, caller, node.func.attr))
-            else:
-                entry.append("{0} trace found: {1} used".format(DEBUGGER_ERROR_CODE, node.func.attr))
-        self.generic_visit(node)
+        elif isinstance(func, ast.Attribute):
+            binding = self.resolve(func.value.id) if isinstance(func.value, ast.Name) else None
+            if binding is None or binding.kind in (FOREIGN, LOCAL):
+                # Nothing is known of what the receiver holds, a module missing from the table may well be a
+                # debugger (``rpdb``, ``pudb.remote``), so any call of a debugger method on it is reported.
+                if func.attr in self.registry.method_names:
+                    self.findings.append(Finding(node.lineno, node.col_offset, USED, func.attr))
+            elif binding.kind == MODULE and func.attr in self.registry.modules[binding.module]:
+                if binding.caller:
+                    self.findings.append(Finding(node.lineno, node.col_offset, USED_ON, func.attr, func.value.id))
+                else:
+                    self.findings.append(Finding(node.lineno, node.col_offset, USED, func.attr))
 
     def visit_Import(self, node):
         for name_node in node.names:
-            if name_node.name in list(debuggers.keys()):
+            if name_node.name in self.registry.modules:
                 if name_node.asname is not None:
-                    self.debuggers_names[name_node.name] = name_node.asname
-                    entry = self.debuggers_redefined.setdefault((node.lineno, node.col_offset), [])
-                    entry.append(
-                        "{0} import for {1} found as {2}".format(DEBUGGER_ERROR_CODE, name_node.name, name_node.asname)
+                    self.bind(name_node.asname, Binding(MODULE, name_node.name, caller=True))
+                    self.findings.append(
+                        Finding(node.lineno, node.col_offset, IMPORTED_AS, name_node.name, name_node.asname)
                     )
                 # Unlike the other imports, we don't want to consider all builtin imports as worthy of flagging.
                 elif name_node.name != "builtins":
-                    self.debuggers_names[name_node.name] = name_node.name
-                    entry = self.debuggers_imported.setdefault((node.lineno, node.col_offset), [])
-                    entry.append("{0} import for {1} found".format(DEBUGGER_ERROR_CODE, name_node.name))
+                    if "." not in name_node.name:
+                        self.bind(name_node.name, Binding(MODULE, name_node.name, caller=True))
+                    self.findings.append(Finding(node.lineno, node.col_offset, IMPORTED, name_node.name))
+            elif name_node.asname is not None:
+                self.bind(name_node.asname, FOREIGN_BINDING)
+            else:
+                self.bind(name_node.name.partition(".")[0], FOREIGN_BINDING)
 
     def visit_ImportFrom(self, node):
-        if node.module in list(debuggers.keys()):
-            for name_node in node.names:
-                if name_node.name in debuggers[node.module]:
-                    if name_node.asname is not None:
-                        self.debuggers_traces_names[name_node.name] = name_node.asname
-                        entry = self.debuggers_traces_redefined.setdefault((node.lineno, node.col_offset), [])
-                        entry.append(
-                            "{0} import for {1} found as {2}".format(
-                                DEBUGGER_ERROR_CODE, name_node.name, name_node.asname
-                            )
-                        )
-                    else:
-                        self.debuggers_traces_names[name_node.name] = name_node.name
-                        entry = self.debugger_traces_imported.setdefault((node.lineno, node.col_offset), [])
-                        entry.append("{0} import for {1} found".format(DEBUGGER_ERROR_CODE, name_node.name))
+        methods = self.registry.modules.get(node.module) if not node.level else None
+        for name_node in node.names:
+            bound_name = name_node.asname or name_node.name
+            if methods is not None and name_node.name == "*":
+                for method in methods:
+                    self.bind(method, Binding(METHOD, node.module, method))
+                if node.module != "builtins":
+                    self.findings.append(Finding(node.lineno, node.col_offset, IMPORTED, node.module))
+            elif methods is not None and name_node.name in methods:
+                self.bind(bound_name, Binding(METHOD, node.module, name_node.name))
+                if name_node.asname is not None:
+                    self.findings.append(
+                        Finding(node.lineno, node.col_offset, IMPORTED_AS, name_node.name, name_node.asname)
+                    )
+                else:
+                    self.findings.append(Finding(node.lineno, node.col_offset, IMPORTED, name_node.name))
+            elif not node.level and "{0}.{1}".format(node.module, name_node.name) in self.registry.modules:
+                self.bind(bound_name, Binding(MODULE, "{0}.{1}".format(node.module, name_node.name)))
+            elif name_node.name != "*":
+                self.bind(bound_name, FOREIGN_BINDING)
+
+
+# Tokens the token engine treats as brackets, and the keywords that start a compound statement's header.
+OPENING_BRACKETS = frozenset(("(", "[", "{"))
+CLOSING_BRACKETS = frozenset((")", "]", "}"))
+COMPOUND_KEYWORDS = frozenset(
+    ("if", "elif", "else", "for", "while", "with", "try", "except", "finally", "async", "def", "class")
+)
+# Stands in for any expression that is neither a name nor an attribute of a name.
+OTHER_EXPRESSION = ast.expr()
+# What encloses the tokens the call scanner is reading: a parenthesized group, a display, or a call or subscript.
+GROUP, DISPLAY, TRAILER = range(3)
+
+
+class TokenDebuggerFinder(DebuggerFinder):
+    """Find what ``DebuggerFinder`` finds from the token stream alone, without building a tree.
+
+    Logical lines are split into statements at ``;`` and at the colon ending a compound statement's header.
+    ``def`` and ``class`` open a scope that lasts until the matching ``DEDENT``, or the end of the line for a
+    body on the header's line. The handlers of ``DebuggerFinder`` do the rest, given just enough of a node.
+    Comprehensions and lambdas are not scopes here: the names they bind only hide the calls inside them.
+
+    Source that does not tokenize raises ``SyntaxError``, but source that tokenizes without parsing is not
+    rejected. Before Python 3.12 tokenizes f-strings into parts, their replacement fields are tokenized here.
+    ``match`` statements are read as plain statements, so names bound in a ``case`` body on its line are missed.
+    """
+
+    def scan(self, source, filename="<unknown>"):
+        import io
+        import keyword
+        import tokenize
+
+        self.keywords = frozenset(keyword.kwlist)
+        self.op_type = tokenize.OP
+        self.name_type = tokenize.NAME
+        if isinstance(source, bytes):
+            tokens = tokenize.tokenize(io.BytesIO(source).readline)
+        else:
+            tokens = tokenize.generate_tokens(io.StringIO(source).readline)
+        try:
+            self.scan_tokens(tokens)
+        except tokenize.TokenError as error:
+            message, (line, col) = error.args
+            raise SyntaxError(message, (filename, line, col + 1, None))
+
+    def scan_tokens(self, tokens):
+        import tokenize
+
+        skipped = (tokenize.COMMENT, tokenize.NL, tokenize.ENCODING)
+        statement = []
+        depth = 0
+        lambdas = 0
+        indent = 0
+        # For every open function or class scope, the indent that closes it, or ``None`` for a body on the
+        # header's line, which the end of the line closes.
+        blocks = []
+        opened = False
+        for token in tokens:
+            kind = token.type
+            if kind in skipped:
+                continue
+            if opened:
+                blocks.append(indent if kind == tokenize.NEWLINE else None)
+                opened = False
+
+            if kind == tokenize.OP:
+                text = token.string
+                if text in OPENING_BRACKETS:
+                    depth += 1
+                elif text in CLOSING_BRACKETS:
+                    depth -= 1
+                elif depth == 0 and text == ";":
+                    self.statement(statement)
+                    statement = []
+                    lambdas = 0
+                    continue
+                elif depth == 0 and text == ":":
+                    if lambdas:
+                        lambdas -= 1
+                    elif statement and statement[0].type == tokenize.NAME and statement[0].string in COMPOUND_KEYWORDS:
+                        opened = self.statement(statement)
+                        statement = []
+                        continue
+            elif kind == tokenize.NAME:
+                if depth == 0 and token.string == "lambda":
+                    lambdas += 1
+            elif kind == tokenize.NEWLINE or kind == tokenize.ENDMARKER:
+                self.statement(statement)
+                statement = []
+                lambdas = 0
+                if blocks and blocks[-1] is None:
+                    blocks.pop()
+                    self.scopes.pop()
+                continue
+            elif kind == tokenize.INDENT:
+                indent += 1
+                continue
+            elif kind == tokenize.DEDENT:
+                indent -= 1
+                while blocks and blocks[-1] == indent:
+                    blocks.pop()
+                    self.scopes.pop()
+                continue
+            statement.append(token)
+
+    def header(self, tokens):
+        """Resolve the calls in a ``def`` or ``class`` header, then open the scope of its body."""
+        name = 2 if tokens[0].string == "async" else 1
+        arguments = name + 1
+        self.calls(tokens[arguments:])
+        if tokens[0].string == "class":
+            scope = Scope(is_class=True, name=tokens[name].string)
+        else:
+            closing = self.closing(tokens, arguments)
+            parameters = arguments + 1
+            scope = Scope(name=tokens[name].string, parameters=self.parameters(tokens[parameters:closing]))
+        self.bind(scope.name, LOCAL_BINDING)
+        self.scopes.append(scope)
+        return True
+
+    def statement(self, tokens):
+        """Bind and resolve what one statement holds, returning ``True`` when it opened a scope."""
+        if not tokens:
+            return False
+        first = tokens[0].string
+        if first in ("def", "class") or (first == "async" and len(tokens) > 1 and tokens[1].string == "def"):
+            return self.header(tokens)
+        if first == "import":
+            node = ast.Import(names=[self.alias(part) for part in self.split(tokens[1:], ",")])
+            self.visit_Import(_located(node, tokens[0]))
+        elif first == "from":
+            self.visit_ImportFrom(_located(self.import_from(tokens), tokens[0]))
+        else:
+            if first == "async" and len(tokens) > 1:
+                first = tokens[1].string
+            if first == "for":
+                self.for_target(tokens)
+            elif first == "with":
+                self.with_targets(tokens)
+            elif first == "except" and len(tokens) > 2 and tokens[-2].string == "as":
+                self.bind(tokens[-1].string, LOCAL_BINDING)
+            else:
+                self.assignment(tokens)
+            if any(token.string == ":=" for token in tokens):
+                self.named_expressions(tokens)
+            self.calls(tokens)
+        return False
+
+    def parameters(self, tokens):
+        """Return the names of the parameters in a ``def`` or ``lambda`` parameter list."""
+        names = []
+        for part in self.split(tokens, ","):
+            while part and part[0].string in ("*", "**"):
+                part = part[1:]
+            if part and self.is_name(part[0]):
+                names.append(part[0].string)
+        return names
+
+    def for_target(self, tokens):
+        """Bind the names a ``for`` statement's header assigns to."""
+        start = 2 if tokens[0].string == "async" else 1
+        self.bind_target(self.target(self.split(tokens[start:], "in")[0]))
+
+    def with_targets(self, tokens):
+        """Bind the names after ``as`` in the items of a ``with`` statement's header."""
+        start = 2 if tokens[0].string == "async" else 1
+        for item in self.split(self.unwrap(tokens[start:]), ","):
+            parts = self.split(item, "as")
+            if len(parts) > 1:
+                self.bind_target(self.target(parts[-1]))
+
+    def named_expressions(self, tokens):
+        """Bind the name of every assignment expression to what its value is bound to."""
+        for index, token in enumerate(tokens):
+            if not (self.is_op(token) and token.string == ":=" and index and self.is_name(tokens[index - 1])):
+                continue
+            value = []
+            depth = 0
+            for item in islice(tokens, index + 1, None):
+                if self.is_op(item):
+                    if item.string in OPENING_BRACKETS:
+                        depth += 1
+                    elif item.string in CLOSING_BRACKETS:
+                        depth -= 1
+                    if depth < 0 or (depth == 0 and item.string == ","):
+                        break
+                elif depth == 0 and item.string in ("for", "async"):
+                    # The value ends where the clauses of the comprehension it is the element of start.
+                    break
+                value.append(item)
+            target = ast.Name(id=tokens[index - 1].string)
+            self.visit_NamedExpr(ast.NamedExpr(target=target, value=self.reference(value)))
+
+    def alias(self, tokens):
+        if len(tokens) > 2 and tokens[-2].string == "as":
+            return ast.alias(name="".join(token.string for token in tokens[:-2]), asname=tokens[-1].string)
+        return ast.alias(name="".join(token.string for token in tokens), asname=None)
+
+    def import_from(self, tokens):
+        index = 1
+        level = 0
+        while tokens[index].string in (".", "..."):
+            level += len(tokens[index].string)
+            index += 1
+        end = index
+        while tokens[end].string != "import":
+            end += 1
+        module = "".join(token.string for token in tokens[index:end]) or None
+        names_start = end + 1
+        names = [self.alias(part) for part in self.split(self.unwrap(tokens[names_start:]), ",") if part]
+        return ast.ImportFrom(module=module, names=names, level=level)
+
+    def assignment(self, tokens):
+        """Bind the names a plain or annotated assignment statement assigns to, like the ``ast`` handlers."""
+        segments = [[]]
+        depth = 0
+        for token in tokens:
+            text = token.string
+            if text == "lambda" and depth == 0:
+                # A lambda's defaults are not assignments, and a lambda is never a name or an attribute.
+                segments[-1].append(token)
+                break
+            if token.type == self.op_type:
+                if text in OPENING_BRACKETS:
+                    depth += 1
+                elif text in CLOSING_BRACKETS:
+                    depth -= 1
+                elif text == "=" and depth == 0:
+                    segments.append([])
+                    continue
+            segments[-1].append(token)
+        if len(segments) < 2:
+            return
+
+        value = self.reference(segments[-1])
+        annotated = self.split(segments[0], ":")
+        if len(annotated) > 1:
+            target = self.unwrap(annotated[0])
+            if len(target) == 1 and self.is_name(target[0]):
+                self.visit_AnnAssign(ast.AnnAssign(target=ast.Name(id=target[0].string), value=value))
+            return
+        self.visit_Assign(ast.Assign(targets=[self.target(segment) for segment in segments[:-1]], value=value))
+
+    def target(self, tokens):
+        tokens = self.unwrap(tokens)
+        if len(tokens) == 1 and self.is_name(tokens[0]):
+            return ast.Name(id=tokens[0].string)
+        sequence = False
+        if self.encloses(tokens, "["):
+            tokens = tokens[1:-1]
+            sequence = True
+        elif len(tokens) > 1 and self.is_op(tokens[0]) and tokens[0].string == "*":
+            return ast.Starred(value=self.target(tokens[1:]))
+        elements = self.split(tokens, ",")
+        if not sequence and len(elements) < 2:
+            return OTHER_EXPRESSION
+        return ast.Tuple(elts=[self.target(element) for element in elements if element])
+
+    def reference(self, tokens):
+        """Return a ``Name`` or an ``Attribute`` of a ``Name`` for an expression that is one, or a stand-in."""
+        tokens = self.unwrap(tokens)
+        if len(tokens) == 1 and self.is_name(tokens[0]):
+            return ast.Name(id=tokens[0].string)
+        if len(tokens) > 2 and self.is_op(tokens[-2]) and tokens[-2].string == "." and self.is_name(tokens[-1]):
+            receiver = self.unwrap(tokens[:-2])
+            if len(receiver) == 1 and self.is_name(receiver[0]):
+                return ast.Attribute(value=ast.Name(id=receiver[0].string), attr=tokens[-1].string)
+        return OTHER_EXPRESSION
+
+    def is_name(self, token):
+        return token.type == self.name_type and token.string not in self.keywords
+
+    def calls(self, tokens):
+        """Resolve every call in a statement, finding the start of the expression each call is part of."""
+        import tokenize
+
+        atoms = (tokenize.NUMBER, tokenize.STRING)
+        fstring_start = getattr(tokenize, "FSTRING_START", None)
+        fstring_end = getattr(tokenize, "FSTRING_END", None)
+        keywords = self.keywords
+        calls = []
+        fields = []
+        frames = []
+        # The first token of the primary expression being read, what it is so far (``("name", id)``,
+        # ``("attr", receiver id or None, attr)`` or ``None``), and whether the last token could end it.
+        start = None
+        shape = None
+        after = False
+        dotted = False
+        # Primaries started inside the innermost bracket, and whether nothing else was seen there, so that
+        # ``(name)`` is known to be a name like the parser knows it.
+        started = 0
+        simple = True
+        previous = None
+        # For every open bracket, the names its comprehensions bind, which no call inside it can be a debugger
+        # by; the depth of the comprehension whose targets are being read; the depth and the tokens of the
+        # parameters of a lambda being read, and the depth and parameters of every lambda whose body is read.
+        bound = []
+        targets = 0
+        parameters = None
+        parameters_depth = 0
+        lambdas = []
+        for token in tokens:
+            kind = token.type
+            text = token.string
+            if parameters is not None:
+                if kind == tokenize.OP and text == ":" and len(frames) == parameters_depth:
+                    lambdas.append((parameters_depth, frozenset(self.parameters(parameters))))
+                    parameters = None
+                else:
+                    parameters.append(token)
+            elif kind == tokenize.NAME and text in keywords:
+                if text == "lambda":
+                    parameters = []
+                    parameters_depth = len(frames)
+                elif text == "for" and frames:
+                    targets = len(frames)
+                    if bound[-1] is None:
+                        bound[-1] = set()
+                elif text == "in" and targets == len(frames):
+                    targets = 0
+            elif targets and kind == tokenize.NAME:
+                bound[targets - 1].add(text)
+            elif lambdas and kind == tokenize.OP and text == "," and lambdas[-1][0] == len(frames):
+                lambdas.pop()
+            if dotted:
+                dotted = False
+                if kind == tokenize.NAME:
+                    receiver = shape[1] if shape is not None and shape[0] == "name" else None
+                    shape = ("attr", receiver, text)
+                    after = True
+                    previous = kind
+                    continue
+            if kind == tokenize.NAME and text not in keywords:
+                start, shape, after = token, ("name", text), True
+                started += 1
+            elif kind in atoms or text in ("None", "True", "False") or (kind == tokenize.OP and text == "..."):
+                if kind == tokenize.STRING and fstring_start is None and "f" in text[: text.find(text[-1])].lower():
+                    fields.extend(self.replacement_fields(token))
+                if not (after and kind == tokenize.STRING and previous in (tokenize.STRING, fstring_end)):
+                    start = token
+                    started += 1
+                shape, after = None, True
+            elif kind == tokenize.OP and text == "." and after:
+                dotted = True
+                after = False
+            elif kind == fstring_start or (kind == tokenize.OP and text in OPENING_BRACKETS):
+                if after and text == "(":
+                    if lambdas and shape is not None and shape[0] == "name":
+                        if any(shape[1] in names for _, names in lambdas):
+                            shape = None
+                    calls.append((start, shape))
+                    frame = TRAILER
+                elif after and text == "[":
+                    frame = TRAILER
+                else:
+                    if not (after and kind == fstring_start and previous in (tokenize.STRING, fstring_end)):
+                        start = token
+                        started += 1
+                    frame = GROUP if text == "(" else DISPLAY
+                frames.append((frame, start, started, simple, len(calls)))
+                bound.append(None)
+                start, shape, after, started, simple = None, None, False, 0, True
+            elif kind == fstring_end or (kind == tokenize.OP and text in CLOSING_BRACKETS):
+                inner = shape if started == 1 and simple else None
+                frame, start, started, simple, first = frames.pop()
+                names = bound.pop()
+                if names:
+                    for index in range(first, len(calls)):
+                        call_start, call_shape = calls[index]
+                        if call_shape is not None and call_shape[0] == "name" and call_shape[1] in names:
+                            calls[index] = (call_start, None)
+                while lambdas and lambdas[-1][0] > len(frames):
+                    lambdas.pop()
+                shape = inner if frame == GROUP else None
+                after = True
+            else:
+                after = False
+                simple = False
+            previous = kind
+
+        # Chained calls start at the same token; the parser visits the outermost, the last opened, first.
+        method_names = self.registry.method_names
+        for start, shape in sorted(reversed(calls), key=lambda call: call[0].start):
+            if shape is None:
+                continue
+            if shape[0] == "name":
+                func = ast.Name(id=shape[1])
+            elif shape[2] in method_names:
+                receiver = ast.Name(id=shape[1]) if shape[1] is not None else OTHER_EXPRESSION
+                func = ast.Attribute(value=receiver, attr=shape[2])
+            else:
+                continue
+            self.visit_Call(_located(ast.Call(func=func), start))
+        for field in fields:
+            self.calls(field)
+
+    def replacement_fields(self, token):
+        """Yield the tokens of each expression in an f-string token, placed where they are in the file."""
+        import io
+        import tokenize
+
+        text = token.string
+        quote = text[-3:] if text[-3:] in ('"""', "'''") else text[-1]
+        lines = token.line.splitlines(True)
+        skipped = (tokenize.NEWLINE, tokenize.NL, tokenize.COMMENT, tokenize.ENDMARKER)
+        for offset, expression in _fstring_expressions(text, text.find(quote) + len(quote), len(text) - len(quote)):
+            # Parenthesized, the expression tokenizes on its own whatever whitespace or newlines it holds.
+            source = "(" + expression + ")"
+            try:
+                field = list(tokenize.generate_tokens(io.StringIO(source).readline))
+            except (tokenize.TokenError, SyntaxError):
+                continue
+            moved = []
+            for sub in field:
+                if sub.type in skipped:
+                    continue
+                row, col = sub.start
+                # Where the token starts in ``text``, less the parenthesis added in front of the first line.
+                index = offset - 1 + _line_offset(source, row) + col
+                newlines = text.count("\n", 0, index)
+                col = index - text.rfind("\n", 0, index) - 1 if newlines else token.start[1] + index
+                line = lines[newlines] if newlines < len(lines) else token.line
+                moved.append(sub._replace(start=(token.start[0] + newlines, col), line=line))
+            yield moved
+
+    def is_op(self, token):
+        return token.type == self.op_type
+
+    def encloses(self, tokens, bracket):
+        """Return whether ``tokens`` are all inside one pair of brackets opened by ``bracket``."""
+        return (
+            len(tokens) > 1
+            and self.is_op(tokens[0])
+            and tokens[0].string == bracket
+            and self.closing(tokens, 0) == len(tokens) - 1
+        )
+
+    def closing(self, tokens, index):
+        """Return the index of the bracket closing the one at ``index``."""
+        depth = 0
+        for position in range(index, len(tokens)):
+            token = tokens[position]
+            if self.is_op(token):
+                if token.string in OPENING_BRACKETS:
+                    depth += 1
+                elif token.string in CLOSING_BRACKETS:
+                    depth -= 1
+                    if depth == 0:
+                        return position
+        return None
+
+    def unwrap(self, tokens):
+        """Strip parentheses around the whole of ``tokens``."""
+        while self.encloses(tokens, "("):
+            tokens = tokens[1:-1]
+        return tokens
+
+    def split(self, tokens, separator):
+        """Split ``tokens`` at every ``separator`` outside brackets."""
+        parts = [[]]
+        depth = 0
+        for token in tokens:
+            if self.is_op(token):
+                if token.string in OPENING_BRACKETS:
+                    depth += 1
+                elif token.string in CLOSING_BRACKETS:
+                    depth -= 1
+            if token.string == separator and depth == 0:
+                parts.append([])
+                continue
+            parts[-1].append(token)
+        return parts
+
+
+def _located(node, token):
+    """Give ``node`` the position of ``token``, with the column in UTF-8 bytes like the parser counts it."""
+    line, col = token.start
+    prefix = token.line[:col]
+    node.lineno = line
+    node.col_offset = col if prefix.isascii() else len(prefix.encode("utf-8"))
+    return node
+
+
+def _line_offset(text, row):
+    """Return the index in ``text`` at which its line ``row``, counting from one, starts."""
+    index = 0
+    for _ in range(row - 1):
+        index = text.index("\n", index) + 1
+    return index
+
+
+def _fstring_expressions(text, start, end):
+    """Yield ``(index, expression)`` for every replacement field in ``text[start:end]``, an f-string's body."""
+    index = start
+    while index < end:
+        if text[index] == "{":
+            if text.startswith("{{", index):
+                index += 2
+                continue
+            for expression in _fstring_field(text, index + 1, end):
+                if isinstance(expression, int):
+                    index = expression
+                else:
+                    yield expression
+        else:
+            index += 1
+
+
+def _fstring_field(text, start, end):
+    """Yield the expressions of the field starting at ``start``, nested ones too, and last the index after it."""
+    index = start
+    depth = 0
+    while index < end:
+        char = text[index]
+        if char in ("'", '"'):
+            closing = text.find(char, index + 1, end)
+            index = closing + 1 if closing >= 0 else end
+            continue
+        if char in "([{":
+            depth += 1
+        elif char in ")]" or (char == "}" and depth):
+            depth -= 1
+        elif depth == 0 and (char in ":}" or (char == "!" and not text.startswith("!=", index))):
+            break
+        index += 1
+    yield start, text[start:index]
+    # A conversion is a single letter; a format spec may hold nested replacement fields.
+    while index < end and text[index] != "}":
+        if text[index] == "{":
+            for expression in _fstring_field(text, index + 1, end):
+                if isinstance(expression, int):
+                    index = expression
+                else:
+                    yield expression
+        else:
+            index += 1
+    yield index + 1
+
+
+ENGINES = {"ast": DebuggerFinder, "tokens": TokenDebuggerFinder}
+
+
+def build_debuggers(replace=None, extend=None):
+    table = parse_debuggers(replace) if replace else debuggers
+    return parse_debuggers(extend or [], table)
+
+
+def build_registry(replace=None, extend=None):
+    """Compile the registry for a run once, so configured debuggers cost nothing per checked node."""
+    if not replace and not extend:
+        return DEFAULT_REGISTRY
+    return DebuggerRegistry(build_debuggers(replace, extend))
+
+
+def check_source(
+    source, filename="<unknown>", tree=None, registry=None, cache=None, finder=None, engine="ast", stopwatch=None
+):
+    """Return ``(line, col, message)`` for every debugger usage in ``source``, a ``str`` or ``bytes`` buffer.
+
+    The buffer is only parsed if it can contain a debugger at all, and not at all when ``tree`` is given. A
+    ``finder`` built for the same registry is reset and reused instead of building a new one; otherwise
+    ``engine`` picks one from ``ENGINES``, ``"tokens"`` skipping the tree for the token stream when no
+    ``tree`` is given. A ``Stopwatch`` times each step into its profile entry.
+    """
+    registry = registry or DEFAULT_REGISTRY
+    stopwatch = stopwatch or NO_STOPWATCH
+    candidate = registry.might_use_debugger(source)
+    stopwatch.lap("prescreen")
+    if not candidate:
+        return []
+
+    if cache is not None:
+        key = cache.key(source, registry)
+        errors = cache.get(key)
+        if stopwatch.entry is not None:
+            stopwatch.entry["cache"] = "miss" if errors is None else "hit"
+        # Hashing the source is not one of the profiled steps.
+        stopwatch.lap(None)
+        if errors is None:
+            errors = _find_errors(source, filename, tree, registry, finder, engine, stopwatch)
+            cache.set(key, errors)
+        return errors
+    return _find_errors(source, filename, tree, registry, finder, engine, stopwatch)
+
+
+def _find_errors(source, filename, tree, registry, parser=None, engine="ast", stopwatch=NO_STOPWATCH):
+    if parser is None:
+        # Walking a tree flake8 already built is cheaper than tokenizing the source again.
+        parser = ENGINES["ast" if tree is not None else engine](registry=registry)
+    else:
+        parser.reset()
+    # The ``tokens`` engine's single pass over the source is counted as ``visit``.
+    if isinstance(parser, TokenDebuggerFinder) and tree is None:
+        parser.scan(source, filename)
+    else:
+        if tree is None:
+            tree = ast.parse(source, filename)
+            stopwatch.lap("parse")
+        parser.visit(tree)
+        if stopwatch.entry is not None:
+            stopwatch.entry["nodes"] += parser.nodes_visited
+    findings = parser.results()
+    stopwatch.lap("visit")
+    errors = _unsuppressed(source, findings)
+    stopwatch.lap("noqa")
+    return errors
+
+
+def _unsuppressed(source, findings):
+    if not findings:
+        return []
+    # Comments are all ASCII, latin-1 keeps them and the line breaks in place whatever the real encoding is.
+    noqa = parse_noqa(source.decode("latin-1") if isinstance(source, bytes) else source)
+    return [
+        (finding.line, finding.col, finding.message) for finding in findings if not is_suppressed(noqa, finding.line)
+    ]
+
+
+LARGE_FILE_SIZE = 16 * 1024 * 1024
+
+
+def _read_file(filename, registry, mmap_threshold=LARGE_FILE_SIZE):
+    """Return the contents of ``filename`` as bytes, mapping files of ``mmap_threshold`` bytes or more.
+
+    A mapped file is pre-screened in place and only copied out when it can contain a debugger, ``b""``
+    standing for one that cannot. ``0`` never maps.
+    """
+    with open(filename, "rb") as source_file:
+        if not mmap_threshold or os.fstat(source_file.fileno()).st_size < mmap_threshold:
+            return source_file.read()
+        import mmap
+
+        with mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[:] if registry.might_use_debugger(mapped) else b""
+
+
+def check_files(files, registry=None, cache=None, engine="ast", doctests=False, mmap_threshold=LARGE_FILE_SIZE):
+    """Yield ``(filename, results)`` for each path, or ``(filename, source)`` pair, in ``files`` as it is checked.
+
+    One registry and one finder serve every file, and each file is read whole as bytes without being split
+    into lines or decoded unless it can contain a debugger, so memory stays flat however many files there are.
+    Files of ``mmap_threshold`` bytes or more are memory-mapped and not read at all unless they can contain
+    one. Unreadable files and syntax errors are reported like flake8 does. With ``doctests``, the examples in
+    each file's docstrings are checked too.
+    """
+    registry = registry or DEFAULT_REGISTRY
+    finder = ENGINES[engine](registry=registry)
+    for item in files:
+        if isinstance(item, tuple):
+            filename, source = item
+        else:
+            filename = item
+            try:
+                source = _read_file(filename, registry, mmap_threshold)
+            except OSError as error:
+                yield filename, _failure(error)
+                continue
+        yield filename, _check_buffer(source, filename, registry, cache, finder, doctests=doctests)
+
+
+def _check_buffer(source, filename, registry, cache=None, finder=None, engine="ast", doctests=False):
+    try:
+        results = check_source(source, filename, None, registry, cache, finder, engine)
+        if doctests:
+            results = results + check_doctests(source, filename, None, registry, finder)
+    except (SyntaxError, UnicodeError, ValueError) as error:
+        results = _failure(error)
+    return results
+
+
+async def check_source_async(
+    source, filename="<unknown>", registry=None, cache=None, engine="ast", executor=None, timeout=None
+):
+    """Coroutine version of ``check_source`` that checks ``source`` in ``executor`` instead of the event loop.
+
+    ``executor`` defaults to the loop's own. Raises ``asyncio.TimeoutError`` when the check takes more than
+    ``timeout`` seconds; a check that already started keeps its thread until it is done, but nothing waits
+    for it anymore.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor, check_source, source, filename, None, registry, cache, None, engine)
+    return await asyncio.wait_for(future, timeout)
+
+
+async def check_files_async(
+    files,
+    registry=None,
+    cache=None,
+    engine="ast",
+    executor=None,
+    limit=8,
+    timeout=None,
+    doctests=False,
+    mmap_threshold=LARGE_FILE_SIZE,
+):
+    """Asynchronously yield ``(filename, results)`` for each path, or ``(filename, source)`` pair, in ``files``.
+
+    Files are read in the loop's default executor and checked in ``executor``, ``limit`` of them at a time,
+    and yielded in the order of ``files`` as with ``check_files``. A file that is not checked within
+    ``timeout`` seconds is reported as ``E902 TimeoutError``. Closing the iterator, or cancelling the task
+    iterating over it, cancels the files that are still pending.
+    """
+    import asyncio
+    from collections import deque
+
+    registry = registry or DEFAULT_REGISTRY
+    pending = deque()
+    try:
+        for item in files:
+            check = _check_file_async(item, registry, cache, engine, executor, timeout, doctests, mmap_threshold)
+            pending.append(asyncio.ensure_future(check))
+            if len(pending) >= limit:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _check_file_async(item, registry, cache, engine, executor, timeout, doctests, mmap_threshold):
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    if isinstance(item, tuple):
+        filename, source = item
+    else:
+        filename = item
+        try:
+            source = await loop.run_in_executor(None, _read_file, filename, registry, mmap_threshold)
+        except OSError as error:
+            return filename, _failure(error)
+    future = loop.run_in_executor(executor, _check_buffer, source, filename, registry, cache, None, engine, doctests)
+    try:
+        return filename, await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        return filename, _failure(TimeoutError("not checked within {0} seconds".format(timeout)))
+
+
+def _failure(error):
+    if isinstance(error, SyntaxError):
+        return [(error.lineno or 1, max((error.offset or 1) - 1, 0), "E999 SyntaxError: {0}".format(error.msg))]
+    return [(1, 0, "E902 {0}: {1}".format(type(error).__name__, error))]
+
+
+def check_doctests(source, filename="<unknown>", tree=None, registry=None, finder=None):
+    """Return ``(line, col, message)`` for every debugger usage in the doctest examples of ``source``.
+
+    The examples of each docstring are checked together, as doctest runs them, and reported at their
+    position in the file. Examples that do not parse are skipped.
+    """
+    import doctest
+
+    registry = registry or DEFAULT_REGISTRY
+    if not registry.might_use_debugger(source):
+        return []
+    tree = tree or ast.parse(source, filename)
+    parser = doctest.DocTestParser()
+    results = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        docstring = ast.get_docstring(node, clean=False)
+        if not docstring or ">>>" not in docstring:
+            continue
+        value = node.body[0].value
+        # Before Python 3.8, a string's line is the one it ends on.
+        first_line = value.lineno if sys.version_info >= (3, 8) else value.lineno - docstring.count("\n")
+        pieces = [
+            (example.source, None, first_line + example.lineno, example.indent + 4)
+            for example in parser.get_examples(docstring, filename)
+        ]
+        results.extend(result[1:] for result in _check_pieces(pieces, registry, finder))
+    return results
+
+
+def iter_notebook_cells(stream, chunk_size=64 * 1024):
+    """Yield ``(index, cell)`` for the cells of the notebook JSON read from ``stream``, counting from one.
+
+    The JSON is decoded one cell at a time as it is read, so a large notebook never has to be held whole.
+    Cells come without their outputs and attachments, which are skipped over without being decoded.
+    """
+    reader = _JSONReader(stream, chunk_size)
+    reader.expect("{")
+    while not reader.next_is("}"):
+        key = reader.value()
+        reader.expect(":")
+        if key == "cells":
+            reader.expect("[")
+            index = 0
+            while not reader.next_is("]"):
+                index += 1
+                yield index, reader.object(skipped=("outputs", "attachments"))
+                reader.next_is(",")
+        else:
+            reader.skip()
+        reader.next_is(",")
+
+
+# What ends a run of characters ``_JSONReader.skip`` can pass over, outside and inside a string.
+JSON_STRUCTURE_REGEX = re.compile(r'["\[\]{}]')
+JSON_STRING_END_REGEX = re.compile(r'["\\]')
+
+
+class _JSONReader(object):
+    """Decodes the values of a JSON document one at a time, reading ``stream`` only as far as needed."""
+
+    def __init__(self, stream, chunk_size):
+        import json
+
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.done = False
+
+    def fill(self, size=None):
+        chunk = self.stream.read(size or self.chunk_size)
+        if not chunk:
+            self.done = True
+            return False
+        # Drop what was decoded already, so the buffer holds at most one value and a chunk.
+        position = self.position
+        self.buffer = self.buffer[position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in " \t\r\n":
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return ""
+
+    def next_is(self, char):
+        """Consume ``char`` if it comes next, returning whether it did."""
+        if self.peek() == char:
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, char):
+        if not self.next_is(char):
+            raise ValueError("Expected {0!r} in notebook JSON at {1!r}".format(char, self.peek() or "end of file"))
+
+    def value(self):
+        self.peek()
+        # Decoding starts over whenever more is read, so read twice as much each time for a large value.
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except ValueError:
+                if not self.fill(size):
+                    raise
+                size *= 2
+                continue
+            # A number or literal at the end of the buffer may continue in the next chunk.
+            if end < len(self.buffer) or not self.fill():
+                self.position = end
+                return value
+
+    def object(self, skipped=()):
+        """Decode the next value, an object, without the values of its ``skipped`` keys."""
+        result = {}
+        self.expect("{")
+        while not self.next_is("}"):
+            key = self.value()
+            self.expect(":")
+            if key in skipped:
+                self.skip()
+            else:
+                result[key] = self.value()
+            self.next_is(",")
+        return result
+
+    def skip(self):
+        """Consume the next value without decoding it, dropping what was read of it as it goes."""
+        if self.peek() not in ("[", "{", '"'):
+            self.value()
+            return
+        depth = 0
+        in_string = False
+        while True:
+            buffer = self.buffer
+            regex = JSON_STRING_END_REGEX if in_string else JSON_STRUCTURE_REGEX
+            match = regex.search(buffer, self.position)
+            if match is None or (in_string and match.group() == "\\" and match.end() == len(buffer)):
+                # Keep an escape at the end of the buffer until the character it escapes is read.
+                self.position = len(buffer) if match is None else match.start()
+                if not self.fill():
+                    raise ValueError("Unterminated value in notebook JSON")
+                continue
+            char = match.group()
+            self.position = match.end()
+            if in_string:
+                if char == "\\":
+                    self.position += 1
+                    continue
+                in_string = False
+            elif char == '"':
+                in_string = True
+                continue
+            elif char in "[{":
+                depth += 1
+                continue
+            else:
+                depth -= 1
+            if depth == 0:
+                return
+
+
+# Cell magics whose body is still Python; any other cell magic makes the cell something else.
+PYTHON_CELL_MAGICS = frozenset(("capture", "prun", "time", "timeit"))
+# Line magics, shell escapes, assignments from them, and help on an object (``?obj``, ``df.head?``, ``obj??``).
+MAGIC_REGEX = re.compile(r"^([ \t]*)(?:[%!?]|[\w.]+[ \t]*=[ \t]*[%!]|[\w.*]+\?\??\s*\Z)")
+
+
+def notebook_code(source):
+    """Return the Python of a code cell with magics replaced by ``pass``, or ``None`` if it is not Python.
+
+    Only lines starting a logical line can be magics, ``% 3)`` continuing an expression is Python.
+    """
+    lines = source.splitlines(True)
+    if lines and lines[0].startswith("%%"):
+        magic = lines[0][2:].split()
+        if not magic or magic[0] not in PYTHON_CELL_MAGICS:
+            return None
+        lines[0] = "\n"
+    state = LOGICAL_LINE_START
+    for index, line in enumerate(lines):
+        magic = MAGIC_REGEX.match(line) if state == LOGICAL_LINE_START else None
+        if magic:
+            lines[index] = magic.group(1) + "pass\n"
+        state = _scan_line(lines[index], state)
+    return "".join(lines)
+
+
+# Bracket depth, open string quote and backslash continuation at the start of a logical line.
+LOGICAL_LINE_START = (0, None, False)
+
+
+def _scan_line(line, state):
+    """Return the state ``_scan_line`` starts the line after ``line`` in, from the ``state`` it started in."""
+    depth, quote, _ = state
+    index = 0
+    length = len(line)
+    while index < length:
+        char = line[index]
+        if quote is not None:
+            if char == "\\":
+                index += 2
+            elif line.startswith(quote, index):
+                index += len(quote)
+                quote = None
+            else:
+                index += 1
+        elif char == "#":
+            return depth, None, False
+        elif char in "\"'":
+            quote = char * 3 if line.startswith(char * 3, index) else char
+            index += len(quote)
+        else:
+            if char in OPENING_BRACKETS:
+                depth += 1
+            elif char in CLOSING_BRACKETS:
+                depth = max(depth - 1, 0)
+            index += 1
+    continued = line.rstrip("\r\n").endswith("\\")
+    if quote is not None and len(quote) == 1 and not continued:
+        quote = None
+    return depth, quote, continued and quote is None
+
+
+def check_notebooks(paths, registry=None):
+    """Yield ``(path, results)`` for each notebook in ``paths``, results being ``(cell, line, col, message)``.
+
+    The code cells of a notebook are checked together, as a kernel runs them, sharing one finder between
+    all notebooks. Cells in other languages are skipped, cells that do not parse once magics are taken out
+    are reported as ``E999`` and unreadable notebooks on cell ``None``.
+    """
+    registry = registry or DEFAULT_REGISTRY
+    finder = DebuggerFinder(registry=registry)
+    for path in paths:
+        pieces = []
+        try:
+            with open(path, "r", encoding="utf-8") as stream:
+                for index, cell in iter_notebook_cells(stream):
+                    if not isinstance(cell, dict) or cell.get("cell_type") != "code":
+                        continue
+                    source = cell.get("source", "")
+                    code = notebook_code(source if isinstance(source, str) else "".join(source))
+                    if code is not None:
+                        pieces.append((code, index, 1, 0))
+        except (OSError, UnicodeError, ValueError) as error:
+            yield path, [(None,) + result for result in _failure(error)]
+            continue
+        if any(registry.might_use_debugger(piece[0]) for piece in pieces):
+            yield path, _check_pieces(pieces, registry, finder, syntax_errors=True)
+        else:
+            yield path, []
+
+
+def _check_pieces(pieces, registry, finder=None, syntax_errors=False):
+    """Check pieces of code as one module, returning ``(key, line, col, message)`` where each piece really is.
+
+    ``pieces`` are ``(source, key, line, col)``: line ``n`` of a piece's source is line ``line + n - 1`` of
+    what ``key`` names, indented by ``col``. Pieces that do not parse on their own are left out, and reported
+    as ``E999`` with ``syntax_errors``.
+    """
+    if not pieces:
+        return []
+    source = "".join(piece[0] if piece[0].endswith("\n") else piece[0] + "\n" for piece in pieces)
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        results = []
+        parsing = []
+        for piece in pieces:
+            error = _syntax_error(piece[0])
+            if error is None:
+                parsing.append(piece)
+            elif syntax_errors:
+                ((line, col, message),) = _failure(error)
+                results.append((piece[1], piece[2] + line - 1, piece[3] + col, message))
+        if len(parsing) < len(pieces):
+            return results + _check_pieces(parsing, registry, finder)
+        # Each piece parses but not all together, as with a late ``from __future__`` import: check them apart.
+        return [result for piece in pieces for result in _check_pieces([piece], registry, finder)]
+
+    origins = []
+    for piece_source, key, line, col in pieces:
+        for offset in range(len(piece_source.splitlines()) or 1):
+            origins.append((key, line + offset, col))
+    results = []
+    for line, col, message in _find_errors(source, "<pieces>", tree, registry, finder):
+        key, origin_line, indent = origins[line - 1]
+        results.append((key, origin_line, indent + col, message))
+    return results
+
+
+def _syntax_error(source):
+    try:
+        ast.parse(source)
+    except SyntaxError as error:
+        return error
+    return None
 
 
 class DebuggerChecker(object):
@@ -103,40 +1771,628 @@ class DebuggerChecker(object):
     name = "flake8-debugger"
     version = __version__
 
-    def __init__(self, tree, filename):
+    registry = DEFAULT_REGISTRY
+    cache = None
+    engine = "ast"
+    profiler = None
+    doctests = False
+    mmap_threshold = LARGE_FILE_SIZE
+
+    def __init__(self, tree, filename, lines=None):
         self.tree = tree
         self.filename = filename
-        self.lines = None
+        # flake8 hands over the lines it already read; only a standalone run has to read the file itself.
+        self.lines = lines
+        self.source = None
 
     def load_file(self):
         if self.filename in ("stdin", "-", None):
             self.filename = "stdin"
+            try:
+                from flake8.engine import pep8 as stdin_utils
+            except ImportError:
+                from flake8 import utils as stdin_utils
             self.lines = stdin_utils.stdin_get_value().splitlines(True)
+        elif self.mmap_threshold and os.path.getsize(self.filename) >= self.mmap_threshold:
+            # Splitting a generated file of hundreds of megabytes into lines and joining them back costs
+            # several times its size, most of them never contain a debugger.
+            self.source = _read_file(self.filename, self.registry, self.mmap_threshold)
         else:
+            import pycodestyle
+
             self.lines = pycodestyle.readlines(self.filename)
 
-        if not self.tree:
-            self.tree = ast.parse("".join(self.lines))
+    def get_source(self):
+        """Return the source to check, reading the file first unless flake8 handed over its lines."""
+        if self.lines is None and self.source is None:
+            self.load_file()
+        return "".join(self.lines) if self.source is None else self.source
+
+    @classmethod
+    def add_options(cls, parser):
+        parser.add_option(
+            "--debuggers",
+            default=None,
+            comma_separated_list=True,
+            parse_from_config=True,
+            help="Comma-separated list of module:method debuggers replacing the built-in ones.",
+        )
+        parser.add_option(
+            "--extend-debuggers",
+            default=None,
+            comma_separated_list=True,
+            parse_from_config=True,
+            help="Comma-separated list of module:method debuggers to check for in addition to the others.",
+        )
+        parser.add_option(
+            "--debugger-cache-dir",
+            default=None,
+            parse_from_config=True,
+            help="Directory in which to cache T100 results of unchanged files. (Default: no cache)",
+        )
+        parser.add_option(
+            "--debugger-doctests",
+            action="store_true",
+            default=False,
+            parse_from_config=True,
+            help="Also check the doctest examples in docstrings for debuggers.",
+        )
+        parser.add_option(
+            "--debugger-mmap-threshold",
+            type=int,
+            default=LARGE_FILE_SIZE,
+            parse_from_config=True,
+            help="Size in bytes from which files the plugin reads itself are memory-mapped, 0 to never map them. "
+            "(Default: {0})".format(LARGE_FILE_SIZE),
+        )
+        parser.add_option(
+            "--debugger-profile",
+            metavar="PATH",
+            default=None,
+            parse_from_config=True,
+            help="Time the T100 check of every file and write a JSON summary to PATH ('-' for stderr) at the end.",
+        )
+        parser.add_option(
+            "--debugger-profile-top",
+            type=int,
+            default=10,
+            parse_from_config=True,
+            help="Number of the slowest files listed in the profile. (Default: 10)",
+        )
+
+    @classmethod
+    def parse_options(cls, options):
+        cls.registry = build_registry(getattr(options, "debuggers", None), getattr(options, "extend_debuggers", None))
+        cache_dir = getattr(options, "debugger_cache_dir", None)
+        cls.cache = ResultCache(cache_dir) if cache_dir else None
+        cls.doctests = bool(getattr(options, "debugger_doctests", False))
+        mmap_threshold = getattr(options, "debugger_mmap_threshold", None)
+        cls.mmap_threshold = LARGE_FILE_SIZE if mmap_threshold is None else mmap_threshold
+        profile = getattr(options, "debugger_profile", None)
+        cls.profiler = Profiler.start(profile, getattr(options, "debugger_profile_top", 10)) if profile else None
 
     def run(self):
-        if not self.tree or not self.lines:
-            self.load_file()
+        stopwatch = Stopwatch(Stopwatch.new_entry(self.filename)) if self.profiler is not None else None
+        source = self.get_source()
+        if stopwatch is not None:
+            stopwatch.lap("read")
+        errors = check_source(source, self.filename, self.tree, self.registry, self.cache, None, self.engine, stopwatch)
+        if self.doctests:
+            errors = errors + check_doctests(source, self.filename, self.tree, self.registry)
+        if stopwatch is not None:
+            self.profiler.record(stopwatch.stop())
+        for line, col, message in errors:
+            yield (line, col, message, DebuggerChecker)
+
+
+DEFAULT_EXCLUDE = ".svn,CVS,.bzr,.hg,.git,__pycache__,.tox,.nox,.eggs,*.egg,.venv,venv"
+
+OUTPUT_FORMAT = "{path}:{line}:{col}: {message}"
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+
+
+def iter_python_files(paths, exclude, extensions=(".py",)):
+    """Yield every file with one of ``extensions`` under ``paths``, skipping anything matching ``exclude``."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(name for name in dirs if not _is_excluded(os.path.join(root, name), exclude))
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                if name.endswith(extensions) and not _is_excluded(file_path, exclude):
+                    yield file_path
+
+
+def _is_excluded(path, exclude):
+    import fnmatch
+
+    name = os.path.basename(path)
+    return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(path, pattern) for pattern in exclude)
+
+
+HUNK_REGEX = re.compile(r"^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def parse_diff(diff):
+    """Map every Python file in a unified diff to the set of line numbers added or changed in it.
+
+    Files whose changes are only removals are left out, there is nothing in them left to check.
+    """
+    changed = {}
+    path = None
+    line = 0
+    # Lines of the current hunk still to come; until they are all read, ``+++ `` and ``--- `` are content.
+    old_remaining = new_remaining = 0
+    for text in diff.splitlines():
+        if old_remaining > 0 or new_remaining > 0:
+            if text.startswith("+"):
+                if path is not None:
+                    changed.setdefault(path, set()).add(line)
+                line += 1
+                new_remaining -= 1
+            elif text.startswith("-"):
+                old_remaining -= 1
+            elif text.startswith(" ") or not text:
+                line += 1
+                old_remaining -= 1
+                new_remaining -= 1
+            continue
+        if text.startswith("+++ "):
+            target = text[4:].split("\t")[0].strip()
+            path = None
+            if target != "/dev/null" and target.endswith(".py"):
+                path = os.path.normpath(target[2:] if target.startswith("b/") else target)
+            continue
+        hunk = HUNK_REGEX.match(text)
+        if hunk:
+            old_count, start, new_count = hunk.groups()
+            line = int(start)
+            old_remaining = 1 if old_count is None else int(old_count)
+            new_remaining = 1 if new_count is None else int(new_count)
+    return changed
+
+
+def git_diff(base):
+    """Return the diff of the working tree against ``base``, with paths relative to the current directory."""
+    import subprocess
+
+    command = ["git", "diff", "--no-color", "--no-ext-diff", "--relative", "-U0", base, "--", "*.py"]
+    output = subprocess.run(command, stdout=subprocess.PIPE, check=True).stdout
+    return output.decode("utf-8", "surrogateescape")
+
+
+def _is_within(path, roots):
+    path = os.path.abspath(path)
+    for root in roots:
+        root = os.path.abspath(root)
+        if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+            return True
+    return False
+
+
+class _Settings(object):
+    """What the command line checks files with, built once per process."""
+
+    __slots__ = ("registry", "cache", "engine", "doctests")
+
+    def __init__(self, cache_dir=None, table=None, engine="ast", doctests=False):
+        self.registry = DebuggerRegistry(table) if table is not None else DEFAULT_REGISTRY
+        self.cache = ResultCache(cache_dir) if cache_dir else None
+        self.engine = engine
+        self.doctests = doctests
+
+
+# The settings of a worker process, set by ``_init_worker`` as the process starts.
+_worker_settings = None
+
+
+def _check_batch(paths, changed_lines=None, settings=None):
+    if settings is None:
+        settings = _worker_settings
+    results = []
+    sources = [path for path in paths if not path.endswith(".ipynb")]
+    for path, errors in check_files(sources, settings.registry, settings.cache, settings.engine, settings.doctests):
+        if changed_lines is not None:
+            lines = changed_lines.get(path, ())
+            errors = [error for error in errors if error[0] in lines]
+        results.append((path, errors))
+
+    notebooks = [path for path in paths if path.endswith(".ipynb")]
+    for path, findings in check_notebooks(notebooks, settings.registry):
+        results.extend(_cell_results(path, findings))
+    return results
+
+
+def _cell_results(path, findings):
+    """Return notebook findings as ``(path, results)`` pairs per cell, as ``path:cell_<n>``."""
+    cells = OrderedDict(((path, []),))
+    for cell, line, col, message in sorted(findings, key=lambda finding: finding[0] or 0):
+        cell_path = path if cell is None else "{0}:cell_{1}".format(path, cell)
+        cells.setdefault(cell_path, []).append((line, col, message))
+    return list(cells.items())
+
+
+def _init_worker(cache_dir, table, engine="ast", doctests=False):
+    global _worker_settings
+    _worker_settings = _Settings(cache_dir, table, engine, doctests)
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def _changed_lines_for(batch, changed_lines):
+    if changed_lines is None:
+        return None
+    return {path: changed_lines[path] for path in batch if path in changed_lines}
+
+
+def iter_results(
+    paths, jobs=1, batch_size=64, cache_dir=None, table=None, changed_lines=None, engine="ast", doctests=False
+):
+    """Yield ``(path, results)`` for every file, fanning batches of files out to ``jobs`` processes.
+
+    ``table`` replaces the built-in debuggers table in every process when given, and ``changed_lines``
+    (as returned by ``parse_diff``) restricts the results to the lines it lists for each path. Notebooks
+    (``.ipynb`` paths) are reported per cell.
+    """
+    if jobs <= 1:
+        settings = _Settings(cache_dir, table, engine, doctests)
+        for batch in _batches(paths, batch_size):
+            for result in _check_batch(batch, _changed_lines_for(batch, changed_lines), settings):
+                yield result
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    initargs = (cache_dir, table, engine, doctests)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=initargs) as executor:
+        # Batches are yielded in the order they were submitted so the output is the same whatever ``jobs`` is.
+        pending = deque()
+        for batch in _batches(paths, batch_size):
+            pending.append(executor.submit(_check_batch, batch, _changed_lines_for(batch, changed_lines)))
+            # Keep a bounded number of batches in flight so huge trees are streamed rather than queued whole.
+            if len(pending) >= jobs * 4:
+                for result in pending.popleft().result():
+                    yield result
+        while pending:
+            for result in pending.popleft().result():
+                yield result
+
+
+def handle_request(request, registry, cache, engine="ast"):
+    """Answer one daemon request: ``{"path": ...}``, ``{"source": ..., "filename": ...}`` or ``{"notebook": ...}``.
+
+    ``"doctests": true`` also checks the doctest examples of a path or source. Notebook results are
+    ``[cell, line, col, message]``. Raises ``ValueError`` for a request that is none of these.
+    """
+    for key in ("notebook", "source", "path"):
+        if key in request:
+            break
+    else:
+        raise ValueError('a request needs a "path", a "source" or a "notebook"')
+    if not isinstance(request[key], str):
+        raise ValueError('"{0}" must be a string'.format(key))
+    if key == "notebook":
+        ((_, results),) = check_notebooks([request["notebook"]], registry)
+        return {"results": [list(result) for result in results]}
+    if key == "source":
+        filename = request.get("filename", "stdin")
+        source = request["source"]
+    else:
+        filename = request["path"]
+        try:
+            with open(filename, "rb") as source_file:
+                source = source_file.read()
+        except OSError as error:
+            return {"results": [list(result) for result in _failure(error)]}
+    results = _check_buffer(source, filename, registry, cache, engine=engine, doctests=bool(request.get("doctests")))
+    return {"results": [list(result) for result in results]}
+
+
+def serve_connection(connection, registry, cache, engine="ast"):
+    """Answer JSON requests, one per line, on ``connection`` until the client closes it or asks to shut down.
+
+    A request that cannot be answered gets ``{"error": message}`` and the connection stays open. Returns
+    ``True`` when the client asked the daemon to shut down.
+    """
+    import json
+
+    reader = connection.makefile("rb")
+    writer = connection.makefile("wb")
+    try:
+        for line in reader:
+            try:
+                request = json.loads(line.decode("utf-8"))
+                if not isinstance(request, dict):
+                    raise ValueError("a request must be a JSON object")
+                if request.get("command") == "shutdown":
+                    return True
+                if request.get("command") == "stats":
+                    response = {"hits": cache.hits, "misses": cache.misses}
+                else:
+                    response = handle_request(request, registry, cache, engine)
+            except ValueError as error:
+                response = {"error": str(error)}
+            writer.write(json.dumps(response).encode("utf-8") + b"\n")
+            writer.flush()
+    finally:
+        reader.close()
+        writer.close()
+    return False
+
+
+def serve(socket_path, registry=None, cache=None, engine="ast"):
+    """Check files and buffers sent over a Unix socket, keeping the registry and a result cache warm."""
+    import socketserver
+
+    class DaemonHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            if serve_connection(self.request, self.server.registry, self.server.cache, self.server.engine):
+                threading.Thread(target=self.server.shutdown).start()
+
+    _remove_stale_socket(socket_path)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, DaemonHandler)
+    server.daemon_threads = True
+    server.registry = registry or DEFAULT_REGISTRY
+    server.cache = cache if cache is not None else MemoryCache()
+    server.engine = engine
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+
+
+def _remove_stale_socket(socket_path):
+    """Remove the socket a daemon left behind at ``socket_path``, refusing to replace anything else."""
+    import socket
+    import stat
+
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError("{0} exists and is not a socket".format(socket_path))
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except ConnectionRefusedError:
+        os.unlink(socket_path)
+        return
+    finally:
+        connection.close()
+    raise FileExistsError("a daemon is already listening on {0}".format(socket_path))
+
+
+def iter_daemon_results(connection, paths, changed_lines=None, doctests=False):
+    """Yield ``(path, results)`` for every file like ``iter_results``, checked by the daemon on ``connection``."""
+    import json
+
+    reader = connection.makefile("rb")
+    writer = connection.makefile("wb")
+    try:
+        for path in paths:
+            if path.endswith(".ipynb"):
+                request = {"notebook": os.path.abspath(path)}
+            else:
+                request = {"path": os.path.abspath(path), "doctests": doctests}
+            writer.write(json.dumps(request).encode("utf-8") + b"\n")
+            writer.flush()
+            line = reader.readline()
+            if not line:
+                raise ConnectionError("the daemon closed the connection")
+            response = json.loads(line.decode("utf-8"))
+            if "error" in response:
+                yield path, _failure(ValueError(response["error"]))
+                continue
+            results = [tuple(result) for result in response["results"]]
+            if path.endswith(".ipynb"):
+                for result in _cell_results(path, results):
+                    yield result
+                continue
+            if changed_lines is not None:
+                lines = changed_lines.get(path, ())
+                results = [result for result in results if result[0] in lines]
+            yield path, results
+    finally:
+        reader.close()
+        writer.close()
+
+
+def write_results(results, stream, output_format="default"):
+    """Write ``(path, results)`` pairs to ``stream`` as they come, returning whether anything was found.
+
+    Each file's results are sorted by location, with every result written once. ``json`` writes one compact
+    object per line and ``sarif`` a single SARIF 2.1.0 log; both are written with sorted keys so that the
+    same results always give the same bytes.
+    """
+    import json
+
+    dumps = json.JSONEncoder(sort_keys=True, separators=(",", ":")).encode
+    if output_format == "sarif":
+        driver = {
+            "informationUri": "https://github.com/jbkahn/flake8-debugger",
+            "name": DebuggerChecker.name,
+            "rules": [{"id": DEBUGGER_ERROR_CODE, "shortDescription": {"text": "Debugger usage or import"}}],
+            "version": __version__,
+        }
+        # The log is written around the results so that they are streamed rather than held for one dump.
+        head, _, tail = dumps(
+            {"$schema": SARIF_SCHEMA, "runs": [{"results": [None], "tool": {"driver": driver}}], "version": "2.1.0"}
+        ).partition("null")
+        stream.write(head)
+
+    found = False
+    for path, file_results in results:
+        for line, col, message in sorted(set(file_results)):
+            if output_format == "default":
+                stream.write(OUTPUT_FORMAT.format(path=path, line=line, col=col + 1, message=message) + "\n")
+                found = True
+                continue
+            code, _, text = message.partition(" ")
+            if output_format == "json":
+                stream.write(dumps({"code": code, "col": col + 1, "line": line, "message": text, "path": path}))
+                stream.write("\n")
+            else:
+                location = {"artifactLocation": {"uri": path}, "region": {"startColumn": col + 1, "startLine": line}}
+                result = {
+                    "level": "warning",
+                    "locations": [{"physicalLocation": location}],
+                    "message": {"text": text},
+                    "ruleId": code,
+                }
+                stream.write(("," if found else "") + dumps(result))
+            found = True
+        stream.flush()
+
+    if output_format == "sarif":
+        stream.write(tail + "\n")
+        stream.flush()
+    return found
+
+
+def main(argv=None):
+    import argparse
+    import socket
+
+    parser = argparse.ArgumentParser(prog="flake8-debugger", description="Check files for T100 debugger usage.")
+    parser.add_argument("paths", nargs="*", default=["."], help="Files and directories to check.")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of processes to use. (Default: CPUs)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Files sent to a process at a time.")
+    parser.add_argument(
+        "--exclude",
+        default=DEFAULT_EXCLUDE,
+        help="Comma-separated list of glob patterns to skip. (Default: {0})".format(DEFAULT_EXCLUDE),
+    )
+    parser.add_argument("--cache-dir", default=None, help="Directory in which to cache results of unchanged files.")
+    parser.add_argument(
+        "--debuggers", default=None, help="Comma-separated list of module:method debuggers replacing the built-in ones."
+    )
+    parser.add_argument(
+        "--extend-debuggers", default=None, help="Comma-separated list of module:method debuggers to also check for."
+    )
+    parser.add_argument(
+        "--engine",
+        choices=sorted(ENGINES),
+        default=None,
+        help="Find debuggers in the syntax tree or in the token stream alone. (Default: ast)",
+    )
+    parser.add_argument("--doctests", action="store_true", help="Also check the doctest examples in docstrings.")
+    parser.add_argument(
+        "--notebooks", action="store_true", help="Also check the code cells of Jupyter notebooks (.ipynb files)."
+    )
+    parser.add_argument(
+        "--format",
+        choices=("default", "json", "sarif"),
+        default="default",
+        help="Print results as flake8 does, as JSON objects one per line or as a SARIF log. (Default: default)",
+    )
+    parser.add_argument(
+        "--diff",
+        metavar="PATH",
+        default=None,
+        help="Only report on lines added in this unified diff ('-' for stdin), skipping files it does not touch.",
+    )
+    parser.add_argument(
+        "--diff-base",
+        metavar="REF",
+        default=None,
+        help="Only report on lines changed in the working tree since this git revision.",
+    )
+    parser.add_argument(
+        "--serve", metavar="SOCKET", default=None, help="Run as a daemon answering requests on this Unix socket."
+    )
+    parser.add_argument(
+        "--daemon",
+        metavar="SOCKET",
+        default=None,
+        help="Have the daemon listening on this Unix socket check files, with the debuggers and engine it runs with.",
+    )
+    args = parser.parse_args(argv)
+    if args.daemon:
+        # These are settings of the daemon, given to ``--serve``, or only matter when checking in this process.
+        daemon_options = (
+            ("--jobs", args.jobs),
+            ("--cache-dir", args.cache_dir),
+            ("--debuggers", args.debuggers),
+            ("--extend-debuggers", args.extend_debuggers),
+            ("--engine", args.engine),
+        )
+        ignored = [option for option, value in daemon_options if value is not None]
+        if ignored:
+            parser.error("{0} cannot be used with --daemon".format(", ".join(ignored)))
+    engine = args.engine or "ast"
+
+    exclude = [pattern.strip() for pattern in args.exclude.split(",") if pattern.strip()]
+    table = None
+    if args.debuggers or args.extend_debuggers:
+        table = build_debuggers(
+            args.debuggers.split(",") if args.debuggers else None,
+            args.extend_debuggers.split(",") if args.extend_debuggers else None,
+        )
+    if args.serve:
+        registry = DebuggerRegistry(table) if table is not None else DEFAULT_REGISTRY
+        try:
+            serve(args.serve, registry, ResultCache(args.cache_dir) if args.cache_dir else None, engine)
+        except FileExistsError as error:
+            parser.error(str(error))
+        return 0
+
+    changed_lines = None
+    if args.diff_base:
+        changed_lines = parse_diff(git_diff(args.diff_base))
+    elif args.diff == "-":
+        changed_lines = parse_diff(sys.stdin.read())
+    elif args.diff:
+        with open(args.diff) as diff_file:
+            changed_lines = parse_diff(diff_file.read())
+
+    if changed_lines is None:
+        files = iter_python_files(args.paths, exclude, (".py", ".ipynb") if args.notebooks else (".py",))
+    else:
+        files = [
+            path
+            for path in sorted(changed_lines)
+            if _is_within(path, args.paths)
+            and not any(_is_excluded(part, exclude) for part in path.split(os.sep))
+            and os.path.exists(path)
+        ]
+    if args.daemon:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(args.daemon)
+        except OSError as error:
+            connection.close()
+            parser.error("cannot connect to the daemon at {0}: {1}".format(args.daemon, error))
+        results = iter_daemon_results(connection, files, changed_lines, args.doctests)
+    else:
+        connection = None
+        jobs = args.jobs or os.cpu_count() or 1
+        results = iter_results(
+            files, jobs, args.batch_size, args.cache_dir, table, changed_lines, engine, args.doctests
+        )
+
+    try:
+        found = write_results(results, sys.stdout, args.format)
+    except ConnectionError as error:
+        if connection is None:
+            raise
+        parser.error("lost the daemon at {0}: {1}".format(args.daemon, error))
+    finally:
+        if connection is not None:
+            connection.close()
+    return 1 if found else 0
+
 
-        parser = DebuggerFinder()
-        parser.visit(self.tree)
-
-        for error, messages in parser.debuggers_used.items():
-            if not pycodestyle.noqa(self.lines[error[0] - 1]):
-                for message in messages:
-                    yield (error[0], error[1], message, DebuggerChecker)
-
-        for error, messages in chain(
-            parser.debuggers_traces_redefined.items(),
-            parser.debugger_traces_imported.items(),
-            parser.debuggers_redefined.items(),
-            parser.debuggers_imported.items(),
-        ):
-            if error not in parser.debuggers_used:
-                if not pycodestyle.noqa(self.lines[error[0] - 1]):
-                    for message in messages:
-                        yield (error[0], error[1], message, DebuggerChecker)
+if __name__ == "__main__":
+    sys.exit(main())
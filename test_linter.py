@@ -1,6 +1,25 @@
+import argparse
+import ast
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
 import pycodestyle
 
-from flake8_debugger import DebuggerChecker
+import benchmark
+
+import flake8_debugger
+
+from flake8_debugger import DEFAULT_REGISTRY, DebuggerChecker, DebuggerFinder, DebuggerRegistry, Profiler, ResultCache
 
 import pytest
 
@@ -80,13 +99,12 @@ class TestQA(object):
 
         assert result == expected_result
 
-    @pytest.mark.skipif(True, reason="Not supported just yet")
     def test_catches_simple_debugger_when_called_off_var(self):
         result = check_code_for_debugger_statements("import ipdb\ntest = ipdb.set_trace\ntest()")
 
         expected_result = [
-            {"line": 1, "message": "T100 import for ipdb found", "col": 0},
             {"line": 3, "message": "T100 trace found: ipdb.set_trace used", "col": 0},
+            {"line": 1, "message": "T100 import for ipdb found", "col": 0},
         ]
         assert result == expected_result
 
@@ -413,3 +431,1401 @@ class TestImportSetTraceCases(object):
                 item["col"] = 0
 
             assert result == expected_result
+
+
+class TestDebuggerRegistry(object):
+    def test_indexes_methods_by_module_and_modules_by_method(self):
+        registry = DebuggerRegistry({"pdb": ["set_trace"], "ipdb": ["set_trace", "sset_trace"]})
+
+        assert registry.modules["ipdb"] == frozenset(["set_trace", "sset_trace"])
+        assert registry.methods["set_trace"] == frozenset(["pdb", "ipdb"])
+        assert registry.method_names == frozenset(["set_trace", "sset_trace"])
+
+    def test_is_read_only(self):
+        with pytest.raises(TypeError):
+            DEFAULT_REGISTRY.modules["remote_pdb"] = frozenset(["set_trace"])
+
+    def test_importing_under_a_second_alias_keeps_the_first(self):
+        result = check_code_for_debugger_statements(
+            "from pdb import set_trace as a\nfrom pdb import set_trace as b\na()\nb()"
+        )
+
+        expected_result = [
+            {"line": 3, "message": "T100 trace found: set_trace used as a", "col": 0},
+            {"line": 4, "message": "T100 trace found: set_trace used as b", "col": 0},
+            {"line": 1, "message": "T100 import for set_trace found as a", "col": 0},
+            {"line": 2, "message": "T100 import for set_trace found as b", "col": 0},
+        ]
+
+        assert result == expected_result
+
+
+class TestPreScreen(object):
+    def test_matches_method_and_module_names(self):
+        assert DEFAULT_REGISTRY.might_use_debugger("import ipdb")
+        assert DEFAULT_REGISTRY.might_use_debugger("x.set_trace()")
+        assert DEFAULT_REGISTRY.might_use_debugger(b"from IPython.terminal import embed")
+        assert not DEFAULT_REGISTRY.might_use_debugger("import math\nprint(math.pi)\n")
+        assert not DEFAULT_REGISTRY.might_use_debugger(b"import math\n")
+
+    def test_skips_visiting_sources_without_candidates(self, monkeypatch):
+        def fail(*args, **kwargs):
+            raise AssertionError("DebuggerFinder should not be built")
+
+        monkeypatch.setattr(flake8_debugger, "DebuggerFinder", fail)
+
+        assert check_code_for_debugger_statements("import math\nmath.floor(1.5)") == []
+
+
+def synthetic_module(functions):
+    """Build a large module mixing ordinary code with a debugger call in every function."""
+    template = (
+        "def f{0}(a, b):\n"
+        "    x = [a + b * {0} for _ in range(3)]\n"
+        "    if x:\n"
+        "        pdb.set_trace()\n"
+        "    return {{'k': x, 'v': (a, b)}}\n"
+    )
+    return "import pdb\n" + "".join(template.format(index) for index in range(functions))
+
+
+class RecursiveDebuggerFinder(DebuggerFinder):
+    """The ``ast.NodeVisitor`` recursion the finder used before it grew its own walker."""
+
+    def visit(self, node):
+        handler = self.handlers.get(type(node))
+        scope = handler(node) if handler is not None else None
+        if scope is None:
+            self.generic_visit(node)
+            return
+        inner = self.scope_fields.get(type(node), ("body",))
+        for field, value in ast.iter_fields(node):
+            if field not in inner:
+                for item in value if isinstance(value, list) else [value]:
+                    if isinstance(item, ast.AST):
+                        self.visit(item)
+        if scope.name is not None:
+            self.bind(scope.name, flake8_debugger.LOCAL_BINDING)
+        self.scopes.append(scope)
+        for field in inner:
+            value = getattr(node, field)
+            for item in value if isinstance(value, list) else [value]:
+                self.visit(item)
+        self.scopes.pop()
+
+
+class TestWalker(object):
+    def test_walks_nodes_in_the_same_order_as_node_visitor(self):
+        tree = ast.parse(synthetic_module(50) + "from ipdb import set_trace as st\nst(); breakpoint()\n")
+        iterative, recursive = DebuggerFinder(), RecursiveDebuggerFinder()
+        iterative.visit(tree)
+        recursive.visit(tree)
+
+        assert repr(iterative.findings) == repr(recursive.findings)
+        assert iterative.nodes_visited == sum(1 for _ in ast.walk(tree))
+
+    def test_handles_nesting_deeper_than_the_recursion_limit(self):
+        tree = ast.parse("import pdb\nx = " + " + ".join(["pdb.set_trace()"] * 900))
+        finder = DebuggerFinder()
+        finder.visit(tree)
+
+        assert len(finder.results()) == 901
+
+    def test_benchmark_nodes_per_second(self):
+        tree = ast.parse(synthetic_module(3000))
+        nodes = sum(1 for _ in ast.walk(tree))
+
+        rates = {}
+        for finder_class in (RecursiveDebuggerFinder, DebuggerFinder):
+            finder = finder_class()
+            start = time.perf_counter()
+            finder.visit(tree)
+            rates[finder_class.__name__] = nodes / (time.perf_counter() - start)
+            assert len(finder.results()) == 3001
+
+        print(
+            "nodes/second: recursive {0:,.0f}, iterative {1:,.0f}".format(
+                rates["RecursiveDebuggerFinder"], rates["DebuggerFinder"]
+            )
+        )
+
+
+class TestProvidedLines(object):
+    def test_uses_lines_from_flake8_without_reading_the_file(self, monkeypatch):
+        def fail(*args, **kwargs):
+            raise AssertionError("the file should not be read again")
+
+        monkeypatch.setattr(pycodestyle, "readlines", fail)
+        code = "import pdb\npdb.set_trace()\n"
+        checker = DebuggerChecker(ast.parse(code), "does/not/exist.py", code.splitlines(True))
+
+        assert [error[:3] for error in checker.run()] == [
+            (2, 0, "T100 trace found: pdb.set_trace used"),
+            (1, 0, "T100 import for pdb found"),
+        ]
+
+    def test_empty_file_from_flake8_is_not_read_again(self, monkeypatch):
+        monkeypatch.setattr(pycodestyle, "readlines", None)
+
+        assert list(DebuggerChecker(ast.parse(""), "does/not/exist.py", []).run()) == []
+
+
+class TestResultCache(object):
+    code = "import pdb\npdb.set_trace()\n"
+
+    def run_checker(self, code):
+        return [error[:3] for error in DebuggerChecker(ast.parse(code), "example.py", code.splitlines(True)).run()]
+
+    def test_unchanged_source_is_served_from_the_cache(self, monkeypatch, tmp_path):
+        cache = ResultCache(str(tmp_path))
+        monkeypatch.setattr(DebuggerChecker, "cache", cache)
+        first = self.run_checker(self.code)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("DebuggerFinder should not be built on a cache hit")
+
+        monkeypatch.setattr(flake8_debugger, "DebuggerFinder", fail)
+
+        assert self.run_checker(self.code) == first
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_changing_the_debugger_table_invalidates_entries(self, monkeypatch, tmp_path):
+        cache = ResultCache(str(tmp_path))
+        monkeypatch.setattr(DebuggerChecker, "cache", cache)
+        self.run_checker(self.code)
+        monkeypatch.setattr(DebuggerChecker, "registry", DebuggerRegistry({"pdb": ["set_trace", "post_mortem"]}))
+
+        assert self.run_checker(self.code) == [
+            (2, 0, "T100 trace found: pdb.set_trace used"),
+            (1, 0, "T100 import for pdb found"),
+        ]
+        assert (cache.hits, cache.misses) == (0, 2)
+
+    def test_evicts_least_recently_used_entries_past_the_size_limit(self, tmp_path):
+        cache = ResultCache(str(tmp_path), max_bytes=100)
+        cache.prune_every = 1
+        for index in range(5):
+            cache.set("key{0}".format(index), [[index, 0, "T100 trace found: set_trace used"]])
+            os.utime(os.path.join(str(tmp_path), "key{0}".format(index)), (index, index))
+        cache.prune()
+
+        assert sorted(os.listdir(str(tmp_path))) == ["key3", "key4"]
+
+    def test_unreadable_entries_are_misses(self, tmp_path):
+        cache = ResultCache(str(tmp_path))
+        (tmp_path / "broken").write_text("[[1, 0")
+
+        assert cache.get("broken") is None
+        assert cache.get("missing") is None
+
+
+class TestCommandLine(object):
+    @pytest.fixture
+    def tree(self, tmp_path):
+        (tmp_path / "clean.py").write_text("import math\n")
+        (tmp_path / "package").mkdir()
+        (tmp_path / "package" / "debug.py").write_text("import pdb\npdb.set_trace()\n")
+        (tmp_path / "package" / "broken.py").write_text("import pdb\ndef (\n")
+        (tmp_path / ".tox").mkdir()
+        (tmp_path / ".tox" / "ignored.py").write_text("import pdb\n")
+        return tmp_path
+
+    def test_finds_python_files_and_skips_excluded_directories(self, tree):
+        files = flake8_debugger.iter_python_files([str(tree)], flake8_debugger.DEFAULT_EXCLUDE.split(","))
+
+        assert [os.path.relpath(path, str(tree)) for path in files] == [
+            "clean.py",
+            os.path.join("package", "broken.py"),
+            os.path.join("package", "debug.py"),
+        ]
+
+    @pytest.mark.parametrize("jobs", [1, 2])
+    def test_reports_in_flake8_format_and_fails(self, tree, capsys, jobs):
+        exit_code = flake8_debugger.main(["--jobs", str(jobs), "--batch-size", "1", str(tree)])
+
+        debug, broken = str(tree / "package" / "debug.py"), str(tree / "package" / "broken.py")
+        assert exit_code == 1
+        assert capsys.readouterr().out.splitlines() == [
+            "{0}:2:5: E999 SyntaxError: invalid syntax".format(broken),
+            "{0}:1:1: T100 import for pdb found".format(debug),
+            "{0}:2:1: T100 trace found: pdb.set_trace used".format(debug),
+        ]
+
+    def test_succeeds_without_findings(self, tree, capsys):
+        assert flake8_debugger.main(["--jobs", "1", str(tree / "clean.py")]) == 0
+        assert capsys.readouterr().out == ""
+
+    @pytest.mark.parametrize("output_format", ["default", "json", "sarif"])
+    def test_output_is_the_same_whatever_the_jobs(self, tree, capsys, output_format):
+        for index in range(8):
+            (tree / "package" / "module{0}.py".format(index)).write_text("import ipdb\n" * index)
+        outputs = set()
+        for jobs in ("1", "3"):
+            flake8_debugger.main(["--jobs", jobs, "--batch-size", "1", "--format", output_format, str(tree)])
+            outputs.add(capsys.readouterr().out)
+
+        assert len(outputs) == 1
+
+    def test_writes_json_lines(self):
+        stream = io.StringIO()
+        results = [("a.py", [(2, 0, "T100 trace found: pdb.set_trace used"), (1, 0, "T100 import for pdb found")])]
+
+        assert flake8_debugger.write_results(results, stream, "json")
+        assert stream.getvalue() == (
+            '{"code":"T100","col":1,"line":1,"message":"import for pdb found","path":"a.py"}\n'
+            '{"code":"T100","col":1,"line":2,"message":"trace found: pdb.set_trace used","path":"a.py"}\n'
+        )
+
+    def test_writes_a_sarif_log(self):
+        results = [
+            ("a.py", [(1, 0, "T100 import for pdb found"), (1, 0, "T100 import for pdb found")]),
+            ("b.py", []),
+            ("c.py", [(3, 4, "E999 SyntaxError: invalid syntax")]),
+        ]
+        stream = io.StringIO()
+
+        assert flake8_debugger.write_results(results, stream, "sarif")
+        (run,) = json.loads(stream.getvalue())["runs"]
+        assert run["tool"]["driver"]["name"] == "flake8-debugger"
+        assert [
+            (
+                result["ruleId"],
+                result["message"]["text"],
+                result["locations"][0]["physicalLocation"]["artifactLocation"]["uri"],
+                result["locations"][0]["physicalLocation"]["region"],
+            )
+            for result in run["results"]
+        ] == [
+            ("T100", "import for pdb found", "a.py", {"startLine": 1, "startColumn": 1}),
+            ("E999", "SyntaxError: invalid syntax", "c.py", {"startLine": 3, "startColumn": 5}),
+        ]
+
+        stream = io.StringIO()
+        assert not flake8_debugger.write_results([("b.py", [])], stream, "sarif")
+        assert json.loads(stream.getvalue())["runs"][0]["results"] == []
+
+
+class TestBenchmark(object):
+    def test_reports_throughput_and_memory(self):
+        results = benchmark.run(["nested_calls", "noqa_lines"], repeat=1)
+
+        assert sorted(results) == ["nested_calls", "noqa_lines"]
+        for metrics in results.values():
+            assert metrics["files_per_second"] > 0
+            assert metrics["nodes_per_second"] > metrics["files_per_second"]
+            assert metrics["peak_memory"] > 0
+
+    def test_flags_regressions_beyond_the_tolerance(self):
+        baseline = {"case": {"files_per_second": 100.0, "nodes_per_second": 1000.0, "peak_memory": 1000}}
+        slower = {"case": {"files_per_second": 70.0, "nodes_per_second": 900.0, "peak_memory": 1500}}
+
+        assert benchmark.compare(baseline, baseline, 0.2) == []
+        assert benchmark.compare(slower, baseline, 0.2) == [
+            "case: files_per_second fell from 100 to 70",
+            "case: peak_memory grew from 1,000 to 1,500 bytes",
+        ]
+
+
+class TestConfiguredDebuggers(object):
+    def test_parses_module_and_method_entries(self):
+        table = flake8_debugger.parse_debuggers(
+            ["remote_pdb:set_trace", " debugpy : listen ", "debugpy:breakpoint", "pdbpp", ""]
+        )
+
+        assert table == {"remote_pdb": ["set_trace"], "debugpy": ["listen", "breakpoint"], "pdbpp": []}
+
+    def test_extends_the_builtin_table(self, monkeypatch):
+        monkeypatch.setattr(DebuggerChecker, "registry", DebuggerChecker.registry)
+        monkeypatch.setattr(DebuggerChecker, "cache", None)
+        options = argparse.Namespace(debuggers=None, extend_debuggers=["pydevd:settrace", "pdbpp"])
+        DebuggerChecker.parse_options(options)
+
+        result = check_code_for_debugger_statements("import pdbpp\nimport pydevd\npydevd.settrace()\npdb.set_trace()")
+
+        assert result == [
+            {"line": 3, "message": "T100 trace found: pydevd.settrace used", "col": 0},
+            {"line": 4, "message": "T100 trace found: set_trace used", "col": 0},
+            {"line": 1, "message": "T100 import for pdbpp found", "col": 0},
+            {"line": 2, "message": "T100 import for pydevd found", "col": 0},
+        ]
+
+    def test_replaces_the_builtin_table(self, monkeypatch):
+        monkeypatch.setattr(DebuggerChecker, "registry", DebuggerChecker.registry)
+        monkeypatch.setattr(DebuggerChecker, "cache", None)
+        DebuggerChecker.parse_options(argparse.Namespace(debuggers=["web_pdb:set_trace"], extend_debuggers=None))
+
+        result = check_code_for_debugger_statements("import pdb\nfrom web_pdb import set_trace\nset_trace()")
+
+        assert result == [
+            {"line": 3, "message": "T100 trace found: set_trace used", "col": 0},
+            {"line": 2, "message": "T100 import for set_trace found", "col": 0},
+        ]
+
+    @pytest.mark.parametrize("engine", sorted(flake8_debugger.ENGINES))
+    def test_bare_breakpoint_follows_the_table(self, engine):
+        registry = flake8_debugger.build_registry(["web_pdb:set_trace"])
+
+        assert flake8_debugger.check_source("breakpoint()\n", registry=registry, engine=engine) == []
+        assert flake8_debugger.check_source("import web_pdb\nbreakpoint()\n", registry=registry, engine=engine) == [
+            (1, 0, "T100 import for web_pdb found")
+        ]
+        registry = flake8_debugger.build_registry(None, ["builtins:breakpoint"])
+        assert flake8_debugger.check_source("breakpoint()\n", registry=registry, engine=engine) == [
+            (1, 0, "T100 trace found: breakpoint used")
+        ]
+
+    def test_defaults_to_the_shared_registry(self):
+        assert flake8_debugger.build_registry() is DEFAULT_REGISTRY
+
+    def test_command_line_accepts_extra_debuggers(self, tmp_path, capsys):
+        (tmp_path / "debug.py").write_text("import remote_pdb\n")
+
+        assert flake8_debugger.main(["--jobs", "1", "--extend-debuggers", "remote_pdb", str(tmp_path)]) == 1
+        assert capsys.readouterr().out.endswith("debug.py:1:1: T100 import for remote_pdb found\n")
+        # Running in-process leaves the plugin as flake8 configured it.
+        assert DebuggerChecker.registry is DEFAULT_REGISTRY
+
+
+class TestFindings(object):
+    def test_messages_are_rendered_from_the_record(self):
+        finder = DebuggerFinder()
+        finder.visit(ast.parse("import ipdb as i\nfrom pdb import set_trace as st\ni.set_trace()\nst()\nbreakpoint()"))
+
+        assert [(finding.line, finding.col, finding.message) for finding in finder.results()] == [
+            (3, 0, "T100 trace found: i.set_trace used"),
+            (4, 0, "T100 trace found: set_trace used as st"),
+            (5, 0, "T100 trace found: breakpoint used"),
+            (1, 0, "T100 import for ipdb found as i"),
+            (2, 0, "T100 import for set_trace found as st"),
+        ]
+
+    @pytest.mark.parametrize("engine", sorted(flake8_debugger.ENGINES))
+    def test_reports_each_finding_once(self, engine):
+        source = "import pdb, pdb\nfrom ipdb import set_trace, set_trace as st, set_trace\nst(); pdb.set_trace()\n"
+
+        assert flake8_debugger.check_source(source, engine=engine) == [
+            (3, 0, "T100 trace found: set_trace used as st"),
+            (3, 6, "T100 trace found: pdb.set_trace used"),
+            (1, 0, "T100 import for pdb found"),
+            (2, 0, "T100 import for set_trace found"),
+            (2, 0, "T100 import for set_trace found as st"),
+        ]
+
+    def test_records_have_no_instance_dict(self):
+        assert not hasattr(flake8_debugger.Finding(1, 0, flake8_debugger.USED, "set_trace"), "__dict__")
+
+
+class TestNoqaIndex(object):
+    def run_checker(self, code):
+        return [error[:3] for error in DebuggerChecker(ast.parse(code), "example.py", code.splitlines(True)).run()]
+
+    def test_indexes_bare_and_code_specific_comments(self):
+        noqa = flake8_debugger.parse_noqa("a  # noqa\nb\nc  # noqa: E501, T100\nd  # NOQA:E501\ne  # nopep8\n")
+
+        assert noqa == {1: None, 3: frozenset(["E501", "T100"]), 4: frozenset(["E501"]), 5: None}
+
+    def test_noqa_for_another_code_does_not_suppress_t100(self):
+        assert self.run_checker("import pdb  # noqa: E501\npdb.set_trace()  # noqa:T100\n") == [
+            (1, 0, "T100 import for pdb found")
+        ]
+
+    def test_code_prefixes_suppress(self):
+        assert self.run_checker("import pdb  # noqa: T1\n") == []
+        assert self.run_checker("import pdb  # noqa: E501,T100\n") == []
+
+
+class TestDiff(object):
+    diff = (
+        "diff --git a/pkg/debug.py b/pkg/debug.py\n"
+        "--- a/pkg/debug.py\n"
+        "+++ b/pkg/debug.py\n"
+        "@@ -1,0 +2,2 @@\n"
+        "+import ipdb\n"
+        "+ipdb.set_trace()\n"
+        "@@ -9 +11 @@ def run():\n"
+        "-    return 1\n"
+        "+    return 2\n"
+        "diff --git a/removed.py b/removed.py\n"
+        "--- a/removed.py\n"
+        "+++ /dev/null\n"
+        "@@ -1 +0,0 @@\n"
+        "-import pdb\n"
+        "diff --git a/README.md b/README.md\n"
+        "--- a/README.md\n"
+        "+++ b/README.md\n"
+        "@@ -1 +1 @@\n"
+        "-Title\n"
+        "+import pdb\n"
+    )
+
+    def test_parses_added_lines_of_python_files(self):
+        assert flake8_debugger.parse_diff(self.diff) == {os.path.join("pkg", "debug.py"): {2, 3, 11}}
+
+    def test_reads_lines_like_file_headers_inside_hunks_as_content(self):
+        diff = (
+            "--- a/a.py\n"
+            "+++ b/a.py\n"
+            "@@ -1,2 +1,4 @@\n"
+            "+x = 1\n"
+            "+++ y\n"
+            "--- z\n"
+            " w = 2\n"
+            "+breakpoint()\n"
+            "--- a/b.py\n"
+            "+++ b/b.py\n"
+            "@@ -3 +3 @@\n"
+            "-pass\n"
+            "+import pdb\n"
+        )
+
+        assert flake8_debugger.parse_diff(diff) == {"a.py": {1, 2, 4}, "b.py": {3}}
+
+    def test_only_reports_changed_lines(self, tmp_path, capsys, monkeypatch):
+        (tmp_path / "pkg").mkdir()
+        (tmp_path / "pkg" / "debug.py").write_text("import pdb\nimport ipdb\nipdb.set_trace()\npdb.set_trace()\n")
+        (tmp_path / "untouched.py").write_text("import pdb\n")
+        (tmp_path / "change.diff").write_text(self.diff)
+        monkeypatch.chdir(tmp_path)
+
+        assert flake8_debugger.main(["--jobs", "1", "--diff", "change.diff"]) == 1
+        assert capsys.readouterr().out.splitlines() == [
+            "{0}:2:1: T100 import for ipdb found".format(os.path.join("pkg", "debug.py")),
+            "{0}:3:1: T100 trace found: ipdb.set_trace used".format(os.path.join("pkg", "debug.py")),
+        ]
+
+    def test_diffs_against_a_git_revision(self, tmp_path, capsys, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "module.py").write_text("import pdb\n")
+        git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        subprocess.run(git + ["init", "-q"], check=True)
+        subprocess.run(git + ["add", "module.py"], check=True)
+        subprocess.run(git + ["commit", "-q", "-m", "base"], check=True)
+        (tmp_path / "module.py").write_text("import pdb\n\nbreakpoint()\n")
+
+        assert flake8_debugger.main(["--jobs", "1", "--diff-base", "HEAD"]) == 1
+        assert capsys.readouterr().out == "module.py:3:1: T100 trace found: breakpoint used\n"
+
+
+class TestScopes(object):
+    def test_catches_trace_rebound_from_an_imported_function(self):
+        result = check_code_for_debugger_statements("from pdb import set_trace\nst = set_trace\nst()")
+
+        assert result == [
+            {"line": 3, "message": "T100 trace found: set_trace used as st", "col": 0},
+            {"line": 1, "message": "T100 import for set_trace found", "col": 0},
+        ]
+
+    def test_catches_star_import(self):
+        result = check_code_for_debugger_statements("from pdb import *\nset_trace()")
+
+        assert result == [
+            {"line": 2, "message": "T100 trace found: set_trace used", "col": 0},
+            {"line": 1, "message": "T100 import for pdb found", "col": 0},
+        ]
+
+    def test_catches_dotted_import_as(self):
+        result = check_code_for_debugger_statements("import celery.contrib.rdb as rdb\nrdb.set_trace()")
+
+        assert result == [
+            {"line": 2, "message": "T100 trace found: rdb.set_trace used", "col": 0},
+            {"line": 1, "message": "T100 import for celery.contrib.rdb found as rdb", "col": 0},
+        ]
+
+    def test_function_imports_do_not_leak_into_the_module(self):
+        result = check_code_for_debugger_statements(
+            "def debug():\n    from pdb import set_trace as st\n    st()\n\nst()"
+        )
+
+        assert result == [
+            {"line": 3, "message": "T100 trace found: set_trace used as st", "col": 4},
+            {"line": 2, "message": "T100 import for set_trace found as st", "col": 4},
+        ]
+
+    def test_methods_do_not_see_class_bindings(self):
+        result = check_code_for_debugger_statements(
+            "class Debug:\n    from pdb import set_trace as st\n\n    def run(self):\n        st()"
+        )
+
+        assert result == [{"line": 2, "message": "T100 import for set_trace found as st", "col": 4}]
+
+    def test_functions_see_module_bindings(self):
+        result = check_code_for_debugger_statements("import pdb as p\n\ndef run():\n    p.set_trace()")
+
+        assert result == [
+            {"line": 4, "message": "T100 trace found: p.set_trace used", "col": 4},
+            {"line": 1, "message": "T100 import for pdb found as p", "col": 0},
+        ]
+
+    def test_shadowed_names_are_not_debuggers(self):
+        result = check_code_for_debugger_statements(
+            "from pdb import set_trace\n\ndef run(breakpoint=None):\n    set_trace = print\n    set_trace()\n"
+            "    breakpoint()\n\ndef breakpoint():\n    pass\n\nbreakpoint()"
+        )
+
+        assert result == [{"line": 1, "message": "T100 import for set_trace found", "col": 0}]
+
+    @pytest.mark.parametrize("engine", sorted(flake8_debugger.ENGINES))
+    @pytest.mark.parametrize(
+        "code",
+        [
+            "def run(a, breakpoint=None):\n    breakpoint()",
+            "async def run(*breakpoint):\n    breakpoint()",
+            "def run(*, breakpoint):\n    breakpoint()",
+            "def run(**breakpoint):\n    breakpoint()",
+            "f = lambda breakpoint: breakpoint()",
+            "for a, (b, *breakpoint) in pairs:\n    breakpoint()",
+            "with open(path) as handle, lock as breakpoint:\n    breakpoint()",
+            "try:\n    pass\nexcept Exception as breakpoint:\n    breakpoint()",
+            "values = [breakpoint() for breakpoint in hooks]",
+            "values = {key: breakpoint() for key, breakpoint in hooks}",
+        ],
+    )
+    def test_parameters_and_targets_shadow_debuggers(self, code, engine):
+        assert flake8_debugger.check_source(code, engine=engine) == []
+
+    @pytest.mark.parametrize("engine", sorted(flake8_debugger.ENGINES))
+    def test_comprehension_targets_do_not_leak(self, engine):
+        code = "values = [hook for breakpoint in hooks]\nf = lambda breakpoint: 0, breakpoint()"
+
+        assert flake8_debugger.check_source(code, engine=engine) == [(2, 26, "T100 trace found: breakpoint used")]
+
+    @pytest.mark.skipif(sys.version_info < (3, 8), reason="assignment expressions are new in Python 3.8")
+    @pytest.mark.parametrize("engine", sorted(flake8_debugger.ENGINES))
+    @pytest.mark.parametrize("code", ["(st := pdb.set_trace); st()", "[st := pdb.set_trace for _ in x]; st()"])
+    def test_assignment_expressions_bind_what_they_assign(self, code, engine):
+        assert flake8_debugger.check_source("import pdb\n" + code, engine=engine) == [
+            (2, code.index("st()"), "T100 trace found: pdb.set_trace used"),
+            (1, 0, "T100 import for pdb found"),
+        ]
+
+    def test_methods_missing_from_the_module_are_ignored(self):
+        result = check_code_for_debugger_statements("import pdb\npdb.sset_trace()")
+
+        assert result == [{"line": 1, "message": "T100 import for pdb found", "col": 0}]
+
+    @pytest.mark.parametrize("engine", sorted(flake8_debugger.ENGINES))
+    @pytest.mark.parametrize(
+        "code",
+        [
+            "import rpdb; rpdb.set_trace()",
+            "from pudb import remote; remote.set_trace()",
+            "from IPython.core import debugger; debugger.set_trace()",
+            "import remote_pdb as rp; rp.set_trace()",
+        ],
+    )
+    def test_calls_on_modules_missing_from_the_table_are_reported(self, code, engine):
+        assert flake8_debugger.check_source(code, engine=engine) == [
+            (1, code.index("; ") + 2, "T100 trace found: set_trace used")
+        ]
+
+    def test_calls_on_unknown_receivers_are_still_reported(self):
+        result = check_code_for_debugger_statements("def run(debugger):\n    debugger.set_trace()")
+
+        assert result == [{"line": 2, "message": "T100 trace found: set_trace used", "col": 4}]
+
+
+class TestCheckSource(object):
+    def test_checks_text(self):
+        assert flake8_debugger.check_source("import pdb\npdb.set_trace()  # noqa: E501\n") == [
+            (2, 0, "T100 trace found: pdb.set_trace used"),
+            (1, 0, "T100 import for pdb found"),
+        ]
+
+    def test_checks_bytes_in_their_declared_encoding(self):
+        source = "# -*- coding: latin-1 -*-\nname = 'café'\nbreakpoint()  # noqa\nbreakpoint()\n".encode("latin-1")
+
+        assert flake8_debugger.check_source(source) == [(4, 0, "T100 trace found: breakpoint used")]
+
+    def test_skips_parsing_buffers_without_candidates(self):
+        assert flake8_debugger.check_source("def (") == []
+
+    def test_reports_syntax_errors_with_the_filename(self):
+        with pytest.raises(SyntaxError) as error:
+            flake8_debugger.check_source("import pdb\ndef (", filename="buffer.py")
+
+        assert error.value.filename == "buffer.py"
+
+    def test_uses_the_given_registry_and_cache(self, tmp_path):
+        registry = DebuggerRegistry({"web_pdb": ["set_trace"]})
+        cache = ResultCache(str(tmp_path))
+        for _ in range(2):
+            assert flake8_debugger.check_source("import web_pdb\n", registry=registry, cache=cache) == [
+                (1, 0, "T100 import for web_pdb found")
+            ]
+
+        assert (cache.hits, cache.misses) == (1, 1)
+
+
+class TestDaemon(object):
+    @pytest.fixture
+    def connection(self):
+        client, server = socket.socketpair()
+        cache = flake8_debugger.MemoryCache()
+        thread = threading.Thread(target=flake8_debugger.serve_connection, args=(server, DEFAULT_REGISTRY, cache))
+        thread.start()
+        yield client
+        client.close()
+        thread.join()
+        server.close()
+
+    def test_answers_requests_for_paths_and_buffers(self):
+        cache = flake8_debugger.MemoryCache()
+
+        assert flake8_debugger.handle_request({"source": "breakpoint()\n"}, DEFAULT_REGISTRY, cache) == {
+            "results": [[1, 0, "T100 trace found: breakpoint used"]]
+        }
+        missing = flake8_debugger.handle_request({"path": "does/not/exist.py"}, DEFAULT_REGISTRY, cache)
+        assert missing["results"][0][2].startswith("E902 FileNotFoundError")
+
+    def test_reuses_results_of_unchanged_content(self, tmp_path, connection):
+        (tmp_path / "a.py").write_text("import pdb\n")
+        (tmp_path / "b.py").write_text("import pdb\n")
+        paths = [str(tmp_path / "a.py"), str(tmp_path / "b.py")]
+
+        assert list(flake8_debugger.iter_daemon_results(connection, paths)) == [
+            (paths[0], [(1, 0, "T100 import for pdb found")]),
+            (paths[1], [(1, 0, "T100 import for pdb found")]),
+        ]
+        stream = connection.makefile("rwb")
+        stream.write(b'{"command": "stats"}\n')
+        stream.flush()
+        assert json.loads(stream.readline().decode("utf-8")) == {"hits": 1, "misses": 1}
+
+    def test_answers_bad_requests_with_an_error_and_keeps_the_connection(self, connection):
+        stream = connection.makefile("rwb")
+        for line in (b"not json\n", b"[1]\n", b'{"sauce": "x = 1"}\n', b'{"path": 3}\n', b"\xff\n"):
+            stream.write(line)
+            stream.flush()
+            assert set(json.loads(stream.readline().decode("utf-8"))) == {"error"}
+
+        stream.write(b'{"source": "breakpoint()"}\n')
+        stream.flush()
+        assert json.loads(stream.readline().decode("utf-8")) == {
+            "results": [[1, 0, "T100 trace found: breakpoint used"]]
+        }
+
+    def test_client_reports_errors_and_lost_connections(self):
+        client, server = socket.socketpair()
+
+        def answer_once():
+            stream = server.makefile("rwb")
+            stream.readline()
+            stream.write(b'{"error": "a request needs a \\"path\\""}\n')
+            stream.flush()
+            stream.readline()
+            stream.close()
+            server.close()
+
+        thread = threading.Thread(target=answer_once)
+        thread.start()
+        results = flake8_debugger.iter_daemon_results(client, ["a.py", "b.py"])
+
+        assert next(results) == ("a.py", [(1, 0, 'E902 ValueError: a request needs a "path"')])
+        with pytest.raises(ConnectionError):
+            next(results)
+        thread.join()
+        client.close()
+
+    @pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets are not available")
+    def test_client_reports_a_missing_daemon(self, tmp_path, capsys):
+        with pytest.raises(SystemExit):
+            flake8_debugger.main(["--daemon", str(tmp_path / "missing.sock"), str(tmp_path)])
+        assert "cannot connect to the daemon" in capsys.readouterr().err
+
+    def test_memory_cache_evicts_least_recently_used(self):
+        cache = flake8_debugger.MemoryCache(max_entries=2)
+        cache.set("a", [])
+        cache.set("b", [])
+        cache.get("a")
+        cache.set("c", [])
+
+        assert list(cache.entries) == ["a", "c"]
+
+    @pytest.fixture
+    def daemon(self):
+        socket_path = os.path.join(tempfile.mkdtemp(), "daemon.sock")
+        server = threading.Thread(target=flake8_debugger.main, args=(["--serve", socket_path],))
+        server.start()
+        while not os.path.exists(socket_path):
+            time.sleep(0.01)
+        yield socket_path
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(socket_path)
+        client.sendall(b'{"command": "shutdown"}\n')
+        client.close()
+        server.join()
+        assert not os.path.exists(socket_path)
+
+    @pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets are not available")
+    def test_command_line_client_and_server(self, tmp_path, capsys, daemon):
+        (tmp_path / "debug.py").write_text("import pdb\n")
+
+        assert flake8_debugger.main(["--daemon", daemon, str(tmp_path)]) == 1
+        assert capsys.readouterr().out == "{0}:1:1: T100 import for pdb found\n".format(tmp_path / "debug.py")
+
+    @pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets are not available")
+    def test_client_checks_doctests_and_notebooks_like_the_command(self, tmp_path, capsys, daemon):
+        (tmp_path / "resume.py").write_text(TestDoctests.source)
+        (tmp_path / "analysis.ipynb").write_text(notebook("import pdb", "x = 1\npdb.set_trace()"))
+        arguments = [str(tmp_path), "--notebooks", "--doctests"]
+
+        assert flake8_debugger.main(["--jobs", "1"] + arguments) == 1
+        expected = sorted(capsys.readouterr().out.splitlines())
+        assert len(expected) == 6
+        assert flake8_debugger.main(["--daemon", daemon] + arguments) == 1
+        assert sorted(capsys.readouterr().out.splitlines()) == expected
+
+    @pytest.mark.parametrize("option", [["--engine", "tokens"], ["--jobs", "2"], ["--extend-debuggers", "remote_pdb"]])
+    def test_client_rejects_settings_of_the_daemon(self, capsys, option):
+        with pytest.raises(SystemExit):
+            flake8_debugger.main(["--daemon", "daemon.sock"] + option)
+        assert "{0} cannot be used with --daemon".format(option[0]) in capsys.readouterr().err
+
+    @pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets are not available")
+    def test_serve_only_replaces_stale_sockets(self, tmp_path, capsys, daemon):
+        (tmp_path / "important.txt").write_text("keep me")
+        with pytest.raises(SystemExit):
+            flake8_debugger.main(["--serve", str(tmp_path / "important.txt")])
+        assert "is not a socket" in capsys.readouterr().err
+        assert (tmp_path / "important.txt").read_text() == "keep me"
+
+        with pytest.raises(SystemExit):
+            flake8_debugger.main(["--serve", daemon])
+        assert "already listening" in capsys.readouterr().err
+
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(str(tmp_path / "stale.sock"))
+        stale.close()
+        flake8_debugger._remove_stale_socket(str(tmp_path / "stale.sock"))
+        assert not os.path.exists(str(tmp_path / "stale.sock"))
+
+
+class TestImportTime(object):
+    # Modules only needed for reading files standalone, the cache, the async API or the command line.
+    deferred_modules = [
+        "pycodestyle",
+        "flake8",
+        "argparse",
+        "asyncio",
+        "concurrent.futures",
+        "hashlib",
+        "json",
+        "socket",
+        "socketserver",
+        "subprocess",
+        "tempfile",
+    ]
+    budget_microseconds = 100000
+
+    def import_times(self, tmp_path):
+        """Return the cumulative ``-X importtime`` of every module imported by a warm ``import flake8_debugger``."""
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=str(tmp_path))
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        command = [sys.executable, "-X", "importtime", "-c", "import flake8_debugger"]
+        cwd = os.path.dirname(os.path.abspath(flake8_debugger.__file__))
+        for _ in range(2):
+            stderr = subprocess.run(command, cwd=cwd, env=env, stderr=subprocess.PIPE, check=True).stderr
+        times = {}
+        for line in stderr.decode("utf-8").splitlines():
+            if line.startswith("import time:") and "|" in line and not line.endswith("imported package"):
+                _, cumulative, name = line.partition(":")[2].split("|")
+                if cumulative.strip().isdigit():
+                    times[name.strip()] = int(cumulative)
+        return times
+
+    def test_defers_imports_flake8_already_provides_for(self, tmp_path):
+        times = self.import_times(tmp_path)
+
+        assert "flake8_debugger" in times
+        assert [name for name in self.deferred_modules if name in times] == []
+
+    def test_stays_within_the_startup_budget(self, tmp_path):
+        assert self.import_times(tmp_path)["flake8_debugger"] < self.budget_microseconds
+
+
+class TestCheckFiles(object):
+    def test_checks_paths_and_sources_lazily(self, tmp_path):
+        (tmp_path / "debug.py").write_text("import pdb\n")
+        files = iter([str(tmp_path / "debug.py"), ("buffer.py", "breakpoint()\n"), str(tmp_path / "missing.py")])
+        results = flake8_debugger.check_files(files)
+
+        assert next(results) == (str(tmp_path / "debug.py"), [(1, 0, "T100 import for pdb found")])
+        assert next(results) == ("buffer.py", [(1, 0, "T100 trace found: breakpoint used")])
+        missing, errors = next(results)
+        assert missing == str(tmp_path / "missing.py")
+        assert errors[0][2].startswith("E902 FileNotFoundError")
+
+    def test_reuses_one_finder_without_leaking_state_between_files(self, monkeypatch):
+        finders = []
+        original_init = DebuggerFinder.__init__
+
+        def counting_init(self, *args, **kwargs):
+            finders.append(self)
+            original_init(self, *args, **kwargs)
+
+        monkeypatch.setattr(DebuggerFinder, "__init__", counting_init)
+        sources = [
+            ("a.py", "from pdb import set_trace as st\nst()\n"),
+            ("b.py", "import pdb\ndef (\n"),
+            ("c.py", "st()  # set_trace\n"),
+        ]
+
+        assert list(flake8_debugger.check_files(sources)) == [
+            (
+                "a.py",
+                [(2, 0, "T100 trace found: set_trace used as st"), (1, 0, "T100 import for set_trace found as st")],
+            ),
+            ("b.py", [(2, 4, "E999 SyntaxError: invalid syntax")]),
+            ("c.py", []),
+        ]
+        assert len(finders) == 1
+
+
+# Statements the generated corpus is made of, each valid on its own line at any depth.
+CORPUS_STATEMENTS = [
+    "import pdb",
+    "import ipdb as dbg, os",
+    "import os.path",
+    "import IPython.terminal.embed",
+    "from pdb import set_trace",
+    "from ipdb import (set_trace as st,\n    sset_trace)",
+    "from celery.contrib import rdb",
+    "from pudb import *",
+    "from . import pdb",
+    "from builtins import breakpoint as bp",
+    "pdb.set_trace()",
+    "dbg.sset_trace(); ipdb.set_trace()",
+    "rdb.set_trace()",
+    "set_trace()",
+    "st()",
+    "bp()",
+    "breakpoint()",
+    "x = pdb.set_trace",
+    "x()",
+    "y = z = pdb",
+    "y.set_trace()",
+    "a, (b) = pdb, ipdb",
+    "[a] = [dbg]",
+    "(c) = ipdb.set_trace",
+    "c(); a.set_trace()",
+    "d: int = rdb.set_trace",
+    "d()",
+    "print(f'{pdb.set_trace()} {x!r:>{width()}}', f\"{'{'}{y.set_trace()=}\")",
+    "\u00e9 = '\u00fc'; st()",
+    "value = [set_trace() for _ in range(3)]",
+    "f = lambda a=x(): breakpoint()",
+    "obj.attr.set_trace()",
+    "(pdb).set_trace()",
+    "foo()[0].set_trace()",
+    "'text' 'more'.set_trace()",
+    "call(\n    pdb.set_trace(),\n)",
+    "pdb.set_trace().set_trace()",
+    "if x: pdb.set_trace()",
+    "x += 1",
+    "st = None  # noqa",
+    "pdb = 1",
+]
+
+
+def generated_module(seed, statements=40):
+    """Return a module nesting ``CORPUS_STATEMENTS`` in functions and classes, the same for the same ``seed``."""
+    generator = random.Random(seed)
+    single_line = [statement for statement in CORPUS_STATEMENTS if "\n" not in statement and ":" not in statement]
+    lines = []
+
+    def block(indent, remaining):
+        for index in range(generator.randint(1, 6)):
+            if index and remaining <= 0:
+                break
+            choice = generator.random()
+            if choice < 0.2 and indent < 12:
+                if generator.random() < 0.3:
+                    lines.append(indent * " " + "@decorate(x())")
+                header = generator.choice(
+                    ["def run(arg=st()):", "async def run(self, *, arg=y.set_trace()):", "class Debug(pdb.Base):"]
+                )
+                lines.append(indent * " " + header)
+                remaining = block(indent + 4, remaining - 1)
+            elif choice < 0.25:
+                lines.append(indent * " " + "def inline(): " + generator.choice(single_line))
+                remaining -= 1
+            else:
+                for line in generator.choice(CORPUS_STATEMENTS).split("\n"):
+                    lines.append(indent * " " + line)
+                remaining -= 1
+        return remaining
+
+    remaining = statements
+    while remaining > 0:
+        remaining = block(0, remaining)
+    return "\n".join(lines) + "\n"
+
+
+def checker_test_sources():
+    """Every string in this file that is a Python module, which covers the code of every checker test."""
+    with open(__file__) as test_file:
+        tree = ast.parse(test_file.read())
+    sources = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value not in sources:
+            try:
+                ast.parse(node.value)
+            except SyntaxError:
+                continue
+            sources.append(node.value)
+    return sources
+
+
+class TestTokenEngine(object):
+    def assert_engines_agree(self, source, registry=None):
+        expected = flake8_debugger.check_source(source, registry=registry)
+        assert flake8_debugger.check_source(source, registry=registry, engine="tokens") == expected
+        return expected
+
+    def test_matches_the_ast_engine_on_the_test_cases(self):
+        sources = checker_test_sources()
+        assert len(sources) > 100
+        found = 0
+        for source in sources:
+            found += len(self.assert_engines_agree(source))
+        assert found > 100
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_matches_the_ast_engine_on_a_generated_corpus(self, seed):
+        source = generated_module(seed)
+        ast.parse(source)
+
+        assert self.assert_engines_agree(source)
+        assert self.assert_engines_agree(source.encode("utf-8"))
+
+    def test_matches_the_ast_engine_on_real_code(self):
+        registry = flake8_debugger.build_registry(extend=["os:getcwd", "os.path:join", "re:compile", "sys:exit"])
+        for path in (flake8_debugger.__file__, benchmark.__file__, __file__, os.__file__, argparse.__file__):
+            with open(path, "rb") as source_file:
+                assert self.assert_engines_agree(source_file.read(), registry)
+
+    def test_reports_columns_in_bytes_and_calls_inside_f_strings(self):
+        source = 'import pdb\n\u00e9 = \'\u00fc\'; pdb.set_trace()\nprint(f"""{x} {\n  pdb.set_trace()}""")\n'
+
+        assert self.assert_engines_agree(source) == [
+            (2, 11, "T100 trace found: pdb.set_trace used"),
+            (4, 2, "T100 trace found: pdb.set_trace used"),
+            (1, 0, "T100 import for pdb found"),
+        ]
+
+    def test_reports_source_that_does_not_tokenize(self):
+        assert list(flake8_debugger.check_files([("bad.py", "import pdb\nfoo(\n")], engine="tokens")) == [
+            ("bad.py", [(3, 0, "E999 SyntaxError: EOF in multi-line statement")])
+        ]
+
+    def test_is_not_an_option_of_the_plugin(self):
+        class Parser(object):
+            def __init__(self):
+                self.options = []
+
+            def add_option(self, name, **kwargs):
+                self.options.append(name)
+
+        parser = Parser()
+        DebuggerChecker.add_options(parser)
+
+        assert "--debugger-doctests" in parser.options
+        assert not [option for option in parser.options if "engine" in option]
+
+    def test_walks_the_tree_flake8_built(self, monkeypatch):
+        def scan(self, source, filename):
+            raise AssertionError("tokenized a file flake8 already parsed")
+
+        monkeypatch.setattr(DebuggerChecker, "engine", "tokens")
+        monkeypatch.setattr(flake8_debugger.TokenDebuggerFinder, "scan", scan)
+        code = "import pdb\npdb.set_trace()\n"
+
+        assert [result[:3] for result in DebuggerChecker(ast.parse(code), "debug.py", code.splitlines(True)).run()] == [
+            (2, 0, "T100 trace found: pdb.set_trace used"),
+            (1, 0, "T100 import for pdb found"),
+        ]
+
+    def test_selected_on_the_command_line(self, tmp_path, capsys):
+        (tmp_path / "debug.py").write_text(generated_module(0))
+
+        assert flake8_debugger.main([str(tmp_path), "-j", "1"]) == 1
+        expected = capsys.readouterr().out
+        assert flake8_debugger.main([str(tmp_path), "-j", "1", "--engine", "tokens"]) == 1
+        assert capsys.readouterr().out == expected
+        assert DebuggerChecker.engine == "ast"
+
+
+class TestProfiler(object):
+    def test_records_each_step_without_changing_results(self, tmp_path, monkeypatch):
+        lines = ["import pdb\n", "pdb.set_trace()  # noqa: E501\n"]
+        expected = list(DebuggerChecker(None, "debug.py", lines).run())
+        monkeypatch.setattr(DebuggerChecker, "engine", "ast")
+        monkeypatch.setattr(DebuggerChecker, "profiler", Profiler(str(tmp_path)))
+        monkeypatch.setattr(DebuggerChecker, "cache", flake8_debugger.MemoryCache())
+
+        assert list(DebuggerChecker(None, "debug.py", lines).run()) == expected
+        assert list(DebuggerChecker(None, "debug.py", lines).run()) == expected
+        assert list(DebuggerChecker(None, "clean.py", ["x = 1\n"]).run()) == []
+
+        [records] = list(tmp_path.iterdir())
+        first, second, clean = [json.loads(line) for line in records.read_text().splitlines()]
+        assert first["filename"] == "debug.py"
+        assert first["nodes"] == sum(1 for _ in ast.walk(ast.parse("".join(lines))))
+        assert first["parse"] > 0 and first["visit"] > 0 and first["total"] >= first["visit"]
+        assert (first["cache"], second["cache"], clean["cache"]) == ("miss", "hit", None)
+        assert clean["nodes"] == 0 and clean["visit"] == 0
+
+    def test_total_includes_doctests(self, tmp_path, monkeypatch):
+        def slow_check_doctests(*args):
+            time.sleep(0.05)
+            return [(5, 8, "T100 import for pdb found")]
+
+        monkeypatch.setattr(DebuggerChecker, "profiler", Profiler(str(tmp_path)))
+        monkeypatch.setattr(DebuggerChecker, "doctests", True)
+        monkeypatch.setattr(flake8_debugger, "check_doctests", slow_check_doctests)
+
+        assert [result[:3] for result in DebuggerChecker(None, "doc.py", ["x = 1\n"]).run()] == [
+            (5, 8, "T100 import for pdb found")
+        ]
+        [records] = list(tmp_path.iterdir())
+        assert json.loads(records.read_text())["total"] >= 0.05
+
+    def test_summarizes_every_process(self, tmp_path):
+        for pid, totals in ((100, [0.5, 0.1]), (200, [0.3, 0.9, 0.2])):
+            with open(str(tmp_path / "{0}.jsonl".format(pid)), "w") as records:
+                for index, total in enumerate(totals):
+                    entry = dict.fromkeys(flake8_debugger.PROFILE_STEPS, total)
+                    entry.update(filename="{0}-{1}.py".format(pid, index), nodes=10, cache="hit" if index else "miss")
+                    records.write(json.dumps(entry) + "\n")
+
+        summary = flake8_debugger.summarize_profile(str(tmp_path), top=2)
+
+        assert (summary["files"], summary["processes"], summary["nodes"]) == (5, 2, 50)
+        assert summary["seconds"]["total"] == pytest.approx(2.0)
+        assert summary["cache"] == {"hits": 3, "misses": 2}
+        assert [entry["filename"] for entry in summary["slowest"]] == ["200-1.py", "100-0.py"]
+
+    def test_flake8_workers_report_to_one_summary(self, tmp_path):
+        for index in range(6):
+            (tmp_path / "debug{0}.py".format(index)).write_text("import pdb\npdb.set_trace()\n")
+        env = dict(os.environ)
+        env.pop(flake8_debugger.PROFILE_DIRECTORY_ENV, None)
+        command = [sys.executable, "-m", "flake8", "--select=T", "-j", "2", "--debugger-profile", "profile.json"]
+        subprocess.run(command + ["--debugger-profile-top", "3", "."], cwd=str(tmp_path), env=env)
+
+        summary = json.loads((tmp_path / "profile.json").read_text())
+        assert summary["files"] == 6
+        assert len(summary["slowest"]) == 3
+        assert [path.name for path in tmp_path.iterdir() if path.suffix != ".py"] == ["profile.json"]
+
+
+def notebook(*cells, **extra):
+    """Return the JSON of a notebook with code cells of ``cells``, or of ``(cell_type, source)`` pairs."""
+    cells = [cell if isinstance(cell, tuple) else ("code", cell) for cell in cells]
+    document = {
+        "cells": [
+            dict({"cell_type": cell_type, "metadata": {}, "source": source.splitlines(True)}, **extra)
+            for cell_type, source in cells
+        ],
+        "metadata": {"kernelspec": {"name": "python3"}},
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    }
+    return json.dumps(document, indent=1)
+
+
+class TestNotebooks(object):
+    def test_streams_cells_whatever_the_chunk_size(self):
+        outputs = [{"output_type": "stream", "text": ['"]}\\', "\u00e9 ["], "execution_count": None}]
+        text = notebook(
+            "import pdb", ("markdown", "# Notes"), "x = [1, 2.5e3, None, true]".replace("true", "True"), outputs=outputs
+        )
+        cells = json.loads(text)["cells"]
+        expected = [
+            (index, {key: cell[key] for key in cell if key != "outputs"}) for index, cell in enumerate(cells, 1)
+        ]
+
+        for chunk_size in (1, 2, 7, 64, 1 << 20):
+            assert list(flake8_debugger.iter_notebook_cells(io.StringIO(text), chunk_size)) == expected
+
+    def test_reads_large_values_in_growing_chunks(self):
+        class CountingStream(io.StringIO):
+            reads = 0
+
+            def read(self, size=-1):
+                self.reads += 1
+                return super(CountingStream, self).read(size)
+
+        source = "x = '{0}'\n".format("y" * 1000) * 8000
+        stream = CountingStream(notebook(source, outputs=[{"output_type": "stream", "text": ["y" * 1000000]}]))
+
+        ((index, cell),) = flake8_debugger.iter_notebook_cells(stream)
+
+        assert "".join(cell["source"]) == source
+        assert "outputs" not in cell
+        assert stream.reads < 40
+
+    def test_holds_one_cell_at_a_time(self, tmp_path):
+        outputs = [{"output_type": "stream", "text": ["x" * 1000] * 10}]
+        path = tmp_path / "large.ipynb"
+        path.write_text(notebook(*["print({0})".format(index) for index in range(500)], outputs=outputs))
+        assert path.stat().st_size > 5000000
+
+        with open(str(path), encoding="utf-8") as stream:
+            tracemalloc.start()
+            count = sum(1 for _ in flake8_debugger.iter_notebook_cells(stream))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        assert count == 500
+        assert peak < 512 * 1024
+
+    def test_strips_magics_and_skips_other_languages(self):
+        assert flake8_debugger.notebook_code("%matplotlib inline\nif x:\n    !ls\n    files = !ls\n") == (
+            "pass\nif x:\n    pass\n    pass\n"
+        )
+        assert flake8_debugger.notebook_code("x = (1 +\n     % 3)\n%time f(x)\n") == "x = (1 +\n     % 3)\npass\n"
+        continued = 's = """\n%x\n"""\ny = 1 + \\\n  %2\n'
+        assert flake8_debugger.notebook_code(continued) == continued
+        assert flake8_debugger.notebook_code("%%time\nbreakpoint()\n") == "\nbreakpoint()\n"
+        assert flake8_debugger.notebook_code("%%bash\nbreakpoint\n") is None
+        assert flake8_debugger.notebook_code("df.head?\n?obj\nif x:\n    obj??\r\nnp.*load*?") == (
+            "pass\npass\nif x:\n    pass\npass\n"
+        )
+        assert flake8_debugger.notebook_code("x = a if b else c\ny = '?'\n") == "x = a if b else c\ny = '?'\n"
+
+    def test_maps_findings_to_cells_resolved_across_cells(self, tmp_path):
+        path = str(tmp_path / "analysis.ipynb")
+        with open(path, "w") as notebook_file:
+            notebook_file.write(
+                notebook(
+                    ("markdown", "pdb.set_trace()"),
+                    "from ipdb import set_trace as st\n%load_ext autoreload",
+                    "%%bash\npdb.set_trace()",
+                    "def broken(:\n    st()",
+                    "for x in y:\n    %time f(x)\n    st()",
+                    "st()  # noqa",
+                )
+            )
+
+        assert list(flake8_debugger.check_notebooks([path])) == [
+            (
+                path,
+                [
+                    (4, 1, 11, "E999 SyntaxError: invalid syntax"),
+                    (5, 3, 4, "T100 trace found: set_trace used as st"),
+                    (2, 1, 0, "T100 import for set_trace found as st"),
+                ],
+            ),
+        ]
+
+    def test_checks_cells_with_modulo_continuation_lines(self, tmp_path):
+        path = tmp_path / "modulo.ipynb"
+        path.write_text(notebook("import pdb\nx = (10\n     % 3)\npdb.set_trace()"))
+
+        assert list(flake8_debugger.check_notebooks([str(path)])) == [
+            (str(path), [(1, 4, 0, "T100 trace found: pdb.set_trace used"), (1, 1, 0, "T100 import for pdb found")])
+        ]
+
+    def test_checks_cells_asking_for_help(self, tmp_path):
+        path = tmp_path / "help.ipynb"
+        path.write_text(notebook("import pdb\ndf.head?\npdb.set_trace()"))
+
+        assert list(flake8_debugger.check_notebooks([str(path)])) == [
+            (str(path), [(1, 3, 0, "T100 trace found: pdb.set_trace used"), (1, 1, 0, "T100 import for pdb found")])
+        ]
+
+    def test_reports_unreadable_notebooks_on_no_cell(self, tmp_path):
+        path = tmp_path / "truncated.ipynb"
+        path.write_text(notebook("import pdb")[:40])
+
+        ((checked, results),) = flake8_debugger.check_notebooks([str(path)])
+
+        assert checked == str(path)
+        assert [result[:3] for result in results] == [(None, 1, 0)]
+        assert results[0][3].startswith("E902 ")
+
+
+class TestDoctests(object):
+    source = (
+        "def resume(state):\n"
+        '    """Resume from ``state``.\n'
+        "\n"
+        "    >>> import pdb\n"
+        "    >>> if state:\n"
+        "    ...     pdb.set_trace()  # noqa\n"
+        "    >>> pdb.set_trace()\n"
+        '    """\n'
+        "\n"
+        "\n"
+        "class Session(object):\n"
+        '    """\n'
+        "    >>> from ipdb import set_trace; set_trace()\n"
+        "    >>> this is not python\n"
+        '    """\n'
+    )
+
+    def test_maps_findings_to_the_docstring_lines(self):
+        assert flake8_debugger.check_doctests(self.source, "resume.py") == [
+            (7, 8, "T100 trace found: pdb.set_trace used"),
+            (4, 8, "T100 import for pdb found"),
+            (13, 36, "T100 trace found: set_trace used"),
+            (13, 8, "T100 import for set_trace found"),
+        ]
+
+    def test_is_an_option_of_the_plugin(self, monkeypatch):
+        monkeypatch.setattr(DebuggerChecker, "doctests", DebuggerChecker.doctests)
+        lines = self.source.splitlines(True)
+
+        assert list(DebuggerChecker(None, "resume.py", lines).run()) == []
+
+        DebuggerChecker.parse_options(argparse.Namespace(debugger_doctests=True))
+        results = list(DebuggerChecker(None, "resume.py", lines).run())
+
+        assert [result[:3] for result in results] == [
+            (7, 8, "T100 trace found: pdb.set_trace used"),
+            (4, 8, "T100 import for pdb found"),
+            (13, 36, "T100 trace found: set_trace used"),
+            (13, 8, "T100 import for set_trace found"),
+        ]
+
+    def test_command_line_checks_notebooks_and_doctests(self, tmp_path, capsys):
+        (tmp_path / "resume.py").write_text(self.source)
+        (tmp_path / "analysis.ipynb").write_text(notebook("import pdb", "x = 1\npdb.set_trace()"))
+
+        assert flake8_debugger.main([str(tmp_path), "-j", "1"]) == 0
+        assert capsys.readouterr().out == ""
+
+        assert flake8_debugger.main([str(tmp_path), "-j", "1", "--notebooks", "--doctests"]) == 1
+        assert capsys.readouterr().out.splitlines() == [
+            "{0}:4:9: T100 import for pdb found".format(tmp_path / "resume.py"),
+            "{0}:7:9: T100 trace found: pdb.set_trace used".format(tmp_path / "resume.py"),
+            "{0}:13:9: T100 import for set_trace found".format(tmp_path / "resume.py"),
+            "{0}:13:37: T100 trace found: set_trace used".format(tmp_path / "resume.py"),
+            "{0}:cell_1:1:1: T100 import for pdb found".format(tmp_path / "analysis.ipynb"),
+            "{0}:cell_2:2:1: T100 trace found: pdb.set_trace used".format(tmp_path / "analysis.ipynb"),
+        ]
+
+
+class TestLargeFiles(object):
+    @pytest.fixture
+    def generated(self, tmp_path):
+        path = tmp_path / "generated.py"
+        path.write_text("".join("BLOB_{0} = '{1}'\n".format(index, "0f" * 32768) for index in range(64)))
+        return path
+
+    def peak_memory(self, path):
+        tracemalloc.start()
+        results = list(DebuggerChecker(None, str(path)).run())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return results, peak
+
+    def test_maps_large_files_instead_of_reading_them(self, generated, monkeypatch):
+        size = generated.stat().st_size
+        assert size > 4000000
+
+        monkeypatch.setattr(DebuggerChecker, "mmap_threshold", 0)
+        results, peak = self.peak_memory(generated)
+        assert results == []
+        assert peak > size
+
+        monkeypatch.setattr(DebuggerChecker, "mmap_threshold", 1024 * 1024)
+        results, peak = self.peak_memory(generated)
+        assert results == []
+        assert peak < 64 * 1024
+
+    def test_checks_mapped_files_that_can_contain_debuggers(self, generated, monkeypatch):
+        with generated.open("a") as source_file:
+            source_file.write("import pdb  # noqa\npdb.set_trace()\n")
+        monkeypatch.setattr(DebuggerChecker, "mmap_threshold", 1024 * 1024)
+
+        results = [result[:3] for result in DebuggerChecker(None, str(generated)).run()]
+
+        assert results == [(66, 0, "T100 trace found: pdb.set_trace used")]
+        assert list(flake8_debugger.check_files([str(generated)], mmap_threshold=1024 * 1024)) == [
+            (str(generated), results)
+        ]
+
+    def test_threshold_is_an_option(self, monkeypatch):
+        monkeypatch.setattr(DebuggerChecker, "mmap_threshold", DebuggerChecker.mmap_threshold)
+
+        DebuggerChecker.parse_options(argparse.Namespace(debugger_mmap_threshold=0))
+        assert DebuggerChecker.mmap_threshold == 0
+
+        DebuggerChecker.parse_options(argparse.Namespace())
+        assert DebuggerChecker.mmap_threshold == flake8_debugger.LARGE_FILE_SIZE
+
+
+class TestAsync(object):
+    @pytest.fixture
+    def slow_checks(self, monkeypatch):
+        """Make every check take 0.05 seconds, recording the filenames checked and the most running at once."""
+        calls = {"files": [], "running": 0, "most": 0}
+        lock = threading.Lock()
+        check_source = flake8_debugger.check_source
+
+        def slow_check_source(source, filename, *args, **kwargs):
+            with lock:
+                calls["files"].append(filename)
+                calls["running"] += 1
+                calls["most"] = max(calls["most"], calls["running"])
+            time.sleep(0.05)
+            with lock:
+                calls["running"] -= 1
+            return check_source(source, filename, *args, **kwargs)
+
+        monkeypatch.setattr(flake8_debugger, "check_source", slow_check_source)
+        return calls
+
+    async def collect_async(self, files, **kwargs):
+        return [result async for result in flake8_debugger.check_files_async(files, **kwargs)]
+
+    def collect(self, files, **kwargs):
+        return asyncio.run(self.collect_async(files, **kwargs))
+
+    def test_yields_what_check_files_does_in_order(self, tmp_path):
+        (tmp_path / "debug.py").write_text("import pdb\n")
+        files = [str(tmp_path / "debug.py"), ("buffer.py", "breakpoint()\n"), ("broken.py", "import pdb\ndef (\n")]
+        files += [("clean{0}.py".format(index), "x = {0}\n".format(index)) for index in range(10)]
+        files.append(str(tmp_path / "missing.py"))
+
+        assert self.collect(files, limit=3) == list(flake8_debugger.check_files(files))
+
+    def test_checks_a_bounded_number_of_files_without_blocking_the_loop(self, slow_checks):
+        async def check():
+            ticks = 0
+            files = [("file{0}.py".format(index), "import pdb\n") for index in range(8)]
+            checking = asyncio.ensure_future(self.collect_async(files, limit=2))
+            while not checking.done():
+                ticks += 1
+                await asyncio.sleep(0.01)
+            return ticks, checking.result()
+
+        ticks, results = asyncio.run(check())
+        assert ticks > 10
+        assert len(results) == 8
+        assert slow_checks["most"] == 2
+        assert len(slow_checks["files"]) == 8
+
+    def test_times_out(self, slow_checks):
+        assert self.collect([("slow.py", "import pdb\n")], timeout=0.01) == [
+            ("slow.py", [(1, 0, "E902 TimeoutError: not checked within 0.01 seconds")])
+        ]
+
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(flake8_debugger.check_source_async("import pdb\n", timeout=0.01))
+        assert asyncio.run(flake8_debugger.check_source_async("import pdb\n")) == [(1, 0, "T100 import for pdb found")]
+
+    def test_closing_cancels_pending_files(self, slow_checks):
+        async def first():
+            iterator = flake8_debugger.check_files_async(
+                [("file{0}.py".format(index), "import pdb\n") for index in range(20)], limit=2
+            )
+            result = await iterator.__anext__()
+            await iterator.aclose()
+            await asyncio.sleep(0.2)
+            return result
+
+        assert asyncio.run(first()) == ("file0.py", [(1, 0, "T100 import for pdb found")])
+        assert len(slow_checks["files"]) <= 3